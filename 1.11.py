@@ -31,7 +31,7 @@ import numpy as np
 import re
 import os
 import pyttsx3
-import glob
+import json
 
 
 class MainScreen(Screen):
@@ -216,6 +216,103 @@ class CapturePopup(Popup):
             self.confirm_button.background_color = [0.5, 0.5, 0.5, 1]  # 灰色表示不可用
 
 
+class ImageManifest:
+    """
+    图片清单 - 记录local_images中每个用户(姓名_ID)的图片文件，
+    采集和删除时增量更新，用户管理界面直接读取，不再每次列出整个目录
+    """
+    def __init__(self, image_dir="local_images"):
+        self.image_dir = image_dir
+        self.manifest_file = os.path.join(image_dir, "manifest.json")
+        self.users = {}  # "姓名_ID" -> {'name', 'id', 'files'}
+        self._load()
+
+    @staticmethod
+    def parse_filename(filename):
+        """解析"姓名_ID_左右手_序号.png"，从右侧拆分以支持姓名中带下划线"""
+        if not filename.endswith(".png"):
+            return None
+        parts = filename[:-len(".png")].rsplit("_", 3)
+        if len(parts) != 4 or not parts[0]:
+            return None
+        return parts[0], parts[1]
+
+    def _load(self):
+        """读取清单；清单不存在时从已有的图片目录导入"""
+        if os.path.exists(self.manifest_file):
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    self.users = json.load(f)
+                return
+            except Exception as e:
+                print(f"读取图片清单失败: {e}")
+        self.import_from_directory()
+
+    def import_from_directory(self):
+        """一次os.scandir遍历图片目录，重建清单"""
+        self.users = {}
+        if os.path.exists(self.image_dir):
+            with os.scandir(self.image_dir) as entries:
+                for entry in entries:
+                    parsed = self.parse_filename(entry.name) if entry.is_file() else None
+                    if parsed:
+                        self._add(parsed[0], parsed[1], entry.name)
+            for user in self.users.values():
+                user['files'].sort()
+            self.save()
+
+    def save(self):
+        """保存清单(先写临时文件再替换)"""
+        if not os.path.exists(self.image_dir):
+            os.makedirs(self.image_dir)
+        try:
+            temp_file = self.manifest_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.users, f, ensure_ascii=False)
+            os.replace(temp_file, self.manifest_file)
+        except Exception as e:
+            print(f"保存图片清单失败: {e}")
+
+    def _add(self, name, id_num, filename):
+        key = f"{name}_{id_num}"
+        user = self.users.setdefault(key, {'name': name, 'id': id_num, 'files': []})
+        if filename not in user['files']:
+            user['files'].append(filename)
+
+    def add_file(self, name, id_num, filename):
+        """记录新采集的图片"""
+        self._add(name, id_num, filename)
+        self.save()
+
+    def get_files(self, name, id_num):
+        """获取用户的所有图片文件名"""
+        return list(self.users.get(f"{name}_{id_num}", {}).get('files', []))
+
+    def remove_user(self, name, id_num):
+        """从清单中删除用户"""
+        if self.users.pop(f"{name}_{id_num}", None) is not None:
+            self.save()
+
+    def search(self, query):
+        """按姓名或身份证号搜索用户"""
+        if not query:
+            return list(self.users.values())
+        query_lower = query.lower()
+        return [user for user in self.users.values()
+                if query_lower in user['name'].lower() or query in user['id']]
+
+
+_image_manifest = None
+
+
+def get_image_manifest():
+    """获取共享的图片清单(首次使用时加载)"""
+    global _image_manifest
+    if _image_manifest is None:
+        _image_manifest = ImageManifest()
+    return _image_manifest
+
+
 def compare_images(image1, image2):
     """
     图像比对函数
@@ -226,6 +323,8 @@ def compare_images(image1, image2):
         float: 相似度得分(0-1之间)
     """
     # 这里为演示返回1(100%匹配)
+    # 占位实现不读取图像内容，这个版本不做批量比对；
+    # 特征比对和一次矩阵运算的 1:N 批量匹配(batch_compare)在 12.py 中
     return 1
 
 
@@ -361,6 +460,9 @@ class CameraLayout(FloatLayout):
         
         # 初始化摄像头
         self.capture = cv2.VideoCapture(0)
+        # 画面纹理缓存(按分辨率复用)
+        self.texture = None
+        self.texture_size = None
         Clock.schedule_interval(self.update_frame, 1.0 / 30.0)  # 30fps更新
         
         # 采集状态
@@ -424,11 +526,12 @@ class CameraLayout(FloatLayout):
     def _confirm_cancel(self, instance):
         """确认取消采集后重置空闲状态 清除已采集照片"""
         self.popup.dismiss()
-        if os.path.exists("local_images"):
-            pattern = f"{self.name}_{self.id_number}_*.png"
-            for filename in os.listdir("local_images"):
-                if filename.startswith(f"{self.name}_{self.id_number}_"):
-                    os.remove(os.path.join("local_images", filename))
+        manifest = get_image_manifest()
+        for filename in manifest.get_files(self.name, self.id_number):
+            filepath = os.path.join("local_images", filename)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        manifest.remove_user(self.name, self.id_number)
         
         self.is_capturing = False
         self.hand = "左"
@@ -452,14 +555,12 @@ class CameraLayout(FloatLayout):
         """实际执行识别逻辑"""
         ret, frame = self.capture.read()
         if ret:
-            # 保存临时图像用于比对
-            temp_filename = "temp_capture.png"
-            cv2.imwrite(temp_filename, frame)
-            current_image = cv2.imread(temp_filename, cv2.IMREAD_GRAYSCALE)
+            # 直接在内存中转换为灰度图用于比对，不再写入/读取临时文件
+            current_image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             match_found = False
             matched_name = None
             
-            # 与存储的所有图像比对
+            # 与存储的所有图像逐张比对(compare_images 是占位实现，见上)
             if os.path.exists("local_images"):
                 for filename in os.listdir("local_images"):
                     if filename.endswith(".png"):
@@ -528,7 +629,8 @@ class CameraLayout(FloatLayout):
                 os.makedirs("local_images")
             # 保存图像(格式: 姓名_ID_左右手_序号.png)
             filename = f"local_images/{self.name}_{self.id_number}_{self.hand}_{self.capture_count + 1}.png"
-            cv2.imwrite(filename, frame)
+            if cv2.imwrite(filename, frame):
+                get_image_manifest().add_file(self.name, self.id_number, os.path.basename(filename))
             self.capture_count += 1
             self.progress += 1
             self.hint_label.text = f"正在采集{self.hand}手 ({self.capture_count}/10)"
@@ -567,6 +669,18 @@ class CameraLayout(FloatLayout):
         self.settings_button.disabled = False
         self.cancel_btn.opacity = 0  # Ensure cancel button is hidden
 
+    def get_texture(self, frame):
+        """按画面尺寸缓存纹理，只有摄像头分辨率变化时才重新创建，并把BGR帧写入纹理"""
+        h, w = frame.shape[:2]
+        if self.texture_size != (w, h):
+            self.texture = Texture.create(size=(w, h), colorfmt="bgr")
+            self.texture.flip_vertical()
+            self.texture_size = (w, h)
+            self.camera_image.texture = self.texture
+        # blit_buffer只接受bytes或一维缓冲区，(h, w, 3)的帧要先展平(连续数组展平不复制)
+        self.texture.blit_buffer(np.ascontiguousarray(frame).reshape(-1), colorfmt="bgr", bufferfmt="ubyte")
+        return self.texture
+
     def update_frame(self, dt):
         """更新摄像头画面，只显示圆圈内内容"""
         ret, frame = self.capture.read()
@@ -587,10 +701,9 @@ class CameraLayout(FloatLayout):
             cv2.circle(masked_frame, center, radius, (255, 255, 255), 2)
 
             # 转换为纹理显示
-            buf = cv2.flip(masked_frame, 0).tobytes()
-            texture = Texture.create(size=(w, h), colorfmt="bgr")
-            texture.blit_buffer(buf, colorfmt="bgr", bufferfmt="ubyte")
-            self.camera_image.texture = texture
+            # 复用缓存的纹理(纹理上垂直翻转，不再需要cv2.flip复制)
+            self.get_texture(masked_frame)
+            self.camera_image.canvas.ask_update()
             
             # 更新进度条
             if self.is_capturing:
@@ -665,37 +778,13 @@ class UserManagementPopup(Popup):
         query = self.search_input.text.strip()
         self.results_layout.clear_widgets()
         
-        if not os.path.exists("local_images"):
+        manifest = get_image_manifest()
+        if not manifest.users:
             self._add_result_label("没有找到任何用户数据")
             return
         
-        # 获取所有用户文件
-        all_files = glob.glob("local_images/*.png")
-        users = {}
-        
-        # 按用户分组
-        for filepath in all_files:
-            filename = os.path.basename(filepath)
-            parts = filename.split("_")
-            if len(parts) >= 3:  # 确保文件名格式正确
-                name, id_num = parts[0], parts[1]
-                key = f"{name}_{id_num}"
-                if key not in users:
-                    users[key] = {
-                        'name': name,
-                        'id': id_num,
-                        'files': []
-                    }
-                users[key]['files'].append(filename)
-        
-        # 筛选匹配的用户
-        matched_users = []
-        if query:
-            for user_key, user_data in users.items():
-                if query.lower() in user_data['name'].lower() or query in user_data['id']:
-                    matched_users.append(user_data)
-        else:
-            matched_users = list(users.values())
+        # 从图片清单中筛选匹配的用户
+        matched_users = manifest.search(query)
         
         # 显示结果
         if not matched_users:
@@ -770,6 +859,7 @@ class UserManagementPopup(Popup):
                 filepath = os.path.join("local_images", filename)
                 if os.path.exists(filepath):
                     os.remove(filepath)
+            get_image_manifest().remove_user(user['name'], user['id'])
             
             self.popup.dismiss()
             self.search_users(None)  # 刷新搜索结果
@@ -91,6 +91,9 @@ class CameraLayout(BoxLayout):
 
         # 初始化摄像头
         self.capture = cv2.VideoCapture(0)
+        # 画面纹理缓存(按分辨率复用)
+        self.texture = None
+        self.texture_size = None
         self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 
@@ -110,6 +113,18 @@ class CameraLayout(BoxLayout):
             Color(0, 1, 0, 1)  # 绿色
             self.progress_circle = Line(circle=(0, 0, 0), width=2)
 
+    def get_texture(self, frame):
+        """按画面尺寸缓存纹理，只有摄像头分辨率变化时才重新创建，并把BGR帧写入纹理"""
+        h, w = frame.shape[:2]
+        if self.texture_size != (w, h):
+            self.texture = Texture.create(size=(w, h), colorfmt="bgr")
+            self.texture.flip_vertical()
+            self.texture_size = (w, h)
+            self.camera_image.texture = self.texture
+        # blit_buffer只接受bytes或一维缓冲区，(h, w, 3)的帧要先展平(连续数组展平不复制)
+        self.texture.blit_buffer(np.ascontiguousarray(frame).reshape(-1), colorfmt="bgr", bufferfmt="ubyte")
+        return self.texture
+
     def update_frame(self, dt):
         """更新摄像头帧"""
         ret, frame = self.capture.read()
@@ -121,10 +136,9 @@ class CameraLayout(BoxLayout):
             cv2.circle(frame, center, radius, (255, 255, 255), 2)
 
             # 将 OpenCV 图像转换为 Kivy 纹理
-            buf = cv2.flip(frame, 0).tobytes()
-            texture = Texture.create(size=(w, h), colorfmt="bgr")
-            texture.blit_buffer(buf, colorfmt="bgr", bufferfmt="ubyte")
-            self.camera_image.texture = texture
+            # 复用缓存的纹理(纹理上垂直翻转，不再需要cv2.flip复制)
+            self.get_texture(frame)
+            self.camera_image.canvas.ask_update()
 
             # 更新进度条
             self.update_progress_circle()
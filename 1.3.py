@@ -1,3 +1,297 @@
+import cv2
+import numpy as np
+import re
+import os
+import multiprocessing
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+
+# 并行比对的工作进程数（图库分片数），默认等于 CPU 核数
+MATCH_WORKERS = os.cpu_count() or 1
+# 图库索引中每个描述符查询的近邻数；在这些近邻中为每张图片找出最近的两个描述符做比值测试
+INDEX_NEIGHBOURS = 64
+# 描述符总数不超过该值时用暴力匹配(结果与逐张 compare_descriptors 完全一致)，超过时才用近似的 FLANN KD-tree
+EXACT_INDEX_MAX_DESCRIPTORS = 20000
+# FLANN 的近邻是近似的，投票只用来挑选候选图片；得票最高的这些图片再用 compare_descriptors 精确复核
+INDEX_RERANK_CANDIDATES = 8
+# 图库目录没有增删文件时，每隔这么多秒才逐个检查一次图片修改时间(覆盖同名图片不会改变目录的修改时间)
+INDEX_RESCAN_INTERVAL = 30.0
+
+# SIFT 检测器和 BFMatcher 只创建一次，所有比对共用
+_sift = None
+_bf_matcher = None
+# 图库描述符的内存缓存: 图片路径 -> (图片修改时间, 关键点数量, 描述符)
+_descriptor_cache = {}
+
+
+def get_sift():
+    global _sift
+    if _sift is None:
+        _sift = cv2.SIFT_create()
+    return _sift
+
+
+def get_bf_matcher():
+    global _bf_matcher
+    if _bf_matcher is None:
+        _bf_matcher = cv2.BFMatcher()
+    return _bf_matcher
+
+
+# 提取关键点数量和描述符（关键点本身只用到数量，不需要保存）
+def extract_descriptors(image):
+    keypoints, descriptors = get_sift().detectAndCompute(image, None)
+    return len(keypoints), descriptors
+
+
+# 读取图库图片的描述符：优先内存缓存，其次 local_images 中的 .sift.npz 旁路文件，都没有时才计算并保存
+def load_descriptors(image_path):
+    mtime = os.path.getmtime(image_path)
+    cached = _descriptor_cache.get(image_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2]
+    sidecar_path = image_path + ".sift.npz"
+    keypoint_count, descriptors = None, None
+    if os.path.exists(sidecar_path) and os.path.getmtime(sidecar_path) >= mtime:
+        try:
+            with np.load(sidecar_path) as data:
+                keypoint_count = int(data["keypoint_count"])
+                descriptors = data["descriptors"] if data["descriptors"].size else None
+        except Exception as e:
+            print(f"读取描述符缓存失败: {e}")
+            keypoint_count = None
+    if keypoint_count is None:
+        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return 0, None
+        keypoint_count, descriptors = extract_descriptors(image)
+        try:
+            np.savez(sidecar_path, keypoint_count=keypoint_count,
+                     descriptors=descriptors if descriptors is not None else np.empty((0, 128), np.float32))
+        except Exception as e:
+            print(f"保存描述符缓存失败: {e}")
+    _descriptor_cache[image_path] = (mtime, keypoint_count, descriptors)
+    return keypoint_count, descriptors
+
+
+# 用已提取好的描述符计算匹配度
+def compare_descriptors(keypoint_count1, descriptors1, keypoint_count2, descriptors2):
+    if descriptors1 is None or descriptors2 is None or len(descriptors2) < 2:
+        return 0
+    matches = get_bf_matcher().knnMatch(descriptors1, descriptors2, k=2)
+    # 过滤匹配点
+    good_matches = [m[0] for m in matches if len(m) == 2 and m[0].distance < 0.75 * m[1].distance]
+    # 计算匹配度
+    return len(good_matches) / max(keypoint_count1, keypoint_count2)
+
+
+# 图片所属用户(文件名去掉手和序号部分)
+def image_owner(filename):
+    return filename.rsplit("_", 2)[0]
+
+
+# 图片所在的分片：按用户的稳定哈希分配，增删用户不会让其他用户换到别的分片
+def image_shard(filename, shard_count):
+    return zlib.crc32(image_owner(filename).encode("utf-8")) % shard_count
+
+
+# 图库描述符索引：所有图库图片的描述符合并成一个索引，
+# 当前帧的每个描述符只查一次最近邻，再把匹配投票回对应的图片/用户
+# 描述符较少时用暴力匹配，投票结果就是 compare_descriptors 的结果；
+# 较多时用 FLANN KD-tree，近似投票可能偏高或偏低，返回的匹配度由 compare_descriptors 对候选图片重新计算
+# shard/shard_count 不为默认值时只索引第 shard 片用户的图片(同一用户的图片总在同一片中)
+# 这就是这个版本的批量比对：SIFT 的比值测试要在每张图片内部取最近邻，
+# 不能像 12.py 的 batch_compare 那样写成一次矩阵乘法；匹配度按图片计算，
+# 识别结果取得分最高的图片所属的用户，不再另外按用户汇总
+class DescriptorIndex:
+    def __init__(self, image_dir="local_images", shard=0, shard_count=1):
+        self.image_dir = image_dir
+        self.shard = shard
+        self.shard_count = shard_count
+        self.signature = None  # (文件名, 修改时间) 列表，变化时才重建索引
+        self.dir_mtime = None  # 上次扫描时图库目录的修改时间
+        self.scanned_at = float("-inf")  # 上次扫描的时间
+        self.filenames = []  # 图片文件名
+        self.keypoint_counts = np.zeros(0, dtype=np.int64)  # 每张图片的关键点数量
+        self.owners = np.zeros(0, dtype=np.int64)  # 每个描述符属于第几张图片
+        self.matcher = None
+        self.exact = True  # 是否为暴力匹配(投票即精确结果)
+
+    def refresh(self):
+        # 目录没有增删文件时跳过 listdir 和逐个 stat，每次查询只需 stat 一次目录
+        try:
+            dir_mtime = os.stat(self.image_dir).st_mtime_ns
+        except OSError:
+            dir_mtime = None
+        now = time.monotonic()
+        if dir_mtime == self.dir_mtime and now - self.scanned_at < INDEX_RESCAN_INTERVAL:
+            return
+        self.dir_mtime = dir_mtime
+        self.scanned_at = now
+        # 图库文件有增删改时重建索引
+        if dir_mtime is None:
+            filenames = []
+        else:
+            filenames = sorted(f for f in os.listdir(self.image_dir) if f.endswith(".png"))
+            if self.shard_count > 1:
+                # 文件名格式为 "name_id_hand_count.png"，同一 name_id 的图片总在同一片中
+                filenames = [f for f in filenames if image_shard(f, self.shard_count) == self.shard]
+        signature = [(f, os.path.getmtime(os.path.join(self.image_dir, f))) for f in filenames]
+        if signature == self.signature:
+            return
+        self.signature = signature
+        self.filenames = filenames
+        all_descriptors = []
+        owners = []
+        keypoint_counts = []
+        for i, filename in enumerate(filenames):
+            count, descriptors = load_descriptors(os.path.join(self.image_dir, filename))
+            keypoint_counts.append(count)
+            # 与 compare_descriptors 一致：少于两个描述符的图片无法做比值测试
+            if descriptors is not None and len(descriptors) >= 2:
+                all_descriptors.append(descriptors)
+                owners.append(np.full(len(descriptors), i, dtype=np.int64))
+        self.keypoint_counts = np.array(keypoint_counts, dtype=np.int64)
+        if not all_descriptors:
+            self.owners = np.zeros(0, dtype=np.int64)
+            self.matcher = None
+            return
+        self.owners = np.concatenate(owners)
+        self.exact = len(self.owners) <= EXACT_INDEX_MAX_DESCRIPTORS
+        if self.exact:
+            self.matcher = cv2.BFMatcher()
+        else:
+            # algorithm=1 即 FLANN_INDEX_KDTREE
+            self.matcher = cv2.FlannBasedMatcher(dict(algorithm=1, trees=4), dict(checks=64))
+        self.matcher.add([np.ascontiguousarray(np.concatenate(all_descriptors), dtype=np.float32)])
+        self.matcher.train()
+
+    def query(self, probe_count, probe_descriptors):
+        # 返回 (最佳图片文件名, 匹配度)，没有图库或没有特征时返回 (None, 0)
+        self.refresh()
+        if self.matcher is None or probe_descriptors is None or len(self.owners) < 2:
+            return None, 0
+        k = min(INDEX_NEIGHBOURS, len(self.owners))
+        matches = self.matcher.knnMatch(np.asarray(probe_descriptors, dtype=np.float32), k=k)
+        votes = []
+        for neighbours in matches:
+            # 按图片分别做比值测试，与 compare_descriptors 对每张图片单独 knnMatch 的结果一致
+            nearest = {}  # 图片 -> 该图片中最近描述符的距离
+            decided = set()
+            for m in neighbours:
+                owner = int(self.owners[m.trainIdx])
+                if owner not in nearest:
+                    nearest[owner] = m.distance
+                elif owner not in decided:
+                    decided.add(owner)
+                    if nearest[owner] < 0.75 * m.distance:
+                        votes.append(owner)
+            # 近邻被截断时，只出现一次的图片的第二近描述符不会比最后一个近邻更近
+            if len(neighbours) == k and k < len(self.owners):
+                bound = 0.75 * neighbours[-1].distance
+                votes.extend(owner for owner, distance in nearest.items()
+                             if owner not in decided and distance < bound)
+        if not votes:
+            return None, 0
+        vote_counts = np.bincount(votes, minlength=len(self.filenames))
+        # 与 compare_descriptors 相同的归一化方式
+        scores = vote_counts / np.maximum(self.keypoint_counts, max(probe_count, 1))
+        if self.exact:
+            best = int(np.argmax(scores))
+            return self.filenames[best], float(scores[best])
+        # FLANN 的票数只是近似值，对得票最高的几张图片用 compare_descriptors 重新计算匹配度
+        candidates = np.argsort(-scores, kind="stable")[:INDEX_RERANK_CANDIDATES]
+        best_filename, best_score = None, 0
+        for i in candidates:
+            if vote_counts[i] == 0:
+                break
+            filename = self.filenames[int(i)]
+            count, descriptors = load_descriptors(os.path.join(self.image_dir, filename))
+            score = compare_descriptors(probe_count, probe_descriptors, count, descriptors)
+            # 匹配度相同时取文件名靠前的图片，与暴力匹配路径的 argmax 一致
+            if score > best_score or (score == best_score and best_filename is not None and filename < best_filename):
+                best_filename, best_score = filename, score
+        return best_filename, best_score
+
+
+# 工作进程中的分片索引：每个进程只持有自己那一片图库的描述符和 KD-tree
+_shard_index = None
+
+
+def _init_shard_worker(image_dir, shard, shard_count):
+    global _shard_index
+    _shard_index = DescriptorIndex(image_dir, shard, shard_count)
+
+
+def _refresh_shard():
+    _shard_index.refresh()
+
+
+def _query_shard(probe_count, probe_descriptors):
+    return _shard_index.query(probe_count, probe_descriptors)
+
+
+# 多进程并行比对：图库按用户分片，每个分片由一个常驻工作进程建立索引，
+# 查询时把当前帧的描述符广播给所有分片，再取各分片最佳结果中的最大值
+class ShardedDescriptorIndex:
+    def __init__(self, image_dir="local_images", workers=MATCH_WORKERS):
+        self.image_dir = image_dir
+        self.workers = workers
+        self.executors = []
+        self.local_index = None  # 无法使用多进程时退回单进程索引
+
+    def start(self):
+        # 需要在导入 Kivy 之前调用(见下方的 __main__ 块)，fork 时还没有窗口和界面线程
+        if self.executors or self.local_index is not None:
+            return
+        # spawn 方式会在子进程中重新导入本脚本（包括 Kivy 窗口），只在支持 fork 的系统上启用多进程
+        if self.workers < 2 or "fork" not in multiprocessing.get_all_start_methods():
+            self.local_index = DescriptorIndex(self.image_dir)
+            return
+        context = multiprocessing.get_context("fork")
+        for shard in range(self.workers):
+            executor = ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_init_shard_worker,
+                                           initargs=(self.image_dir, shard, self.workers))
+            # 预先建立分片索引，第一次识别不用等待
+            executor.submit(_refresh_shard)
+            self.executors.append(executor)
+
+    def query(self, probe_count, probe_descriptors):
+        # 返回 (最佳图片文件名, 匹配度)，与 DescriptorIndex.query 相同
+        if not self.executors and self.local_index is None:
+            # 没有在导入 Kivy 前启动工作进程(例如作为模块导入时)，不再在窗口创建后 fork，直接用单进程索引
+            self.local_index = DescriptorIndex(self.image_dir)
+        if self.local_index is not None:
+            return self.local_index.query(probe_count, probe_descriptors)
+        if probe_descriptors is None:
+            return None, 0
+        try:
+            futures = [executor.submit(_query_shard, probe_count, probe_descriptors) for executor in self.executors]
+            results = [future.result() for future in futures]
+        except Exception as e:
+            print(f"并行比对失败，改为单进程比对: {e}")
+            self.stop()
+            self.local_index = DescriptorIndex(self.image_dir)
+            return self.local_index.query(probe_count, probe_descriptors)
+        # 匹配度相同时取文件名靠前的图片，与单进程索引的结果一致
+        return min(results, key=lambda result: (-result[1], result[0] or ""))
+
+    def stop(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.executors = []
+
+
+_descriptor_index = ShardedDescriptorIndex()
+
+
+# Kivy 在导入时就会创建窗口(kivy.uix 下的模块都会导入 kivy.core.window)，
+# 比对工作进程必须在导入 Kivy 之前 fork，子进程中才不会带有窗口和 GL 上下文
+if __name__ == "__main__":
+    _descriptor_index.start()
+
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
@@ -9,10 +303,6 @@ from kivy.graphics import Color, Ellipse, Line
 from kivy.clock import Clock
 from kivy.graphics.texture import Texture
 from kivy.core.window import Window
-import cv2
-import numpy as np
-import re
-import os
 import pyttsx3
 
 
@@ -61,19 +351,10 @@ class CapturePopup(Popup):
 
 # 简答的图像比对（假设）
 def compare_images(image1, image2):
-    # 使用 SIFT 特征检测器
-    sift = cv2.SIFT_create()
     # 检测关键点和描述符
-    keypoints1, descriptors1 = sift.detectAndCompute(image1, None)
-    keypoints2, descriptors2 = sift.detectAndCompute(image2, None)
-    # 使用 BFMatcher 进行匹配
-    bf = cv2.BFMatcher()
-    matches = bf.knnMatch(descriptors1, descriptors2, k=2)
-    # 过滤匹配点
-    good_matches = [m for m, n in matches if m.distance < 0.75 * n.distance]
-    # 计算匹配度
-    similarity = len(good_matches) / max(len(keypoints1), len(keypoints2))
-    return similarity
+    keypoint_count1, descriptors1 = extract_descriptors(image1)
+    keypoint_count2, descriptors2 = extract_descriptors(image2)
+    return compare_descriptors(keypoint_count1, descriptors1, keypoint_count2, descriptors2)
 
 
 # 识别弹窗
@@ -142,6 +423,9 @@ class CameraLayout(BoxLayout):
         self.add_widget(self.camera_image)
         # 初始化摄像头
         self.capture = cv2.VideoCapture(0)
+        # 画面纹理缓存(按分辨率复用)
+        self.texture = None
+        self.texture_size = None
         self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
         # 定时更新视频流
@@ -163,6 +447,18 @@ class CameraLayout(BoxLayout):
         self.engine = pyttsx3.init()
         self.engine.setProperty("rate", 150)  # 设置语速
 
+    def get_texture(self, frame):
+        """按画面尺寸缓存纹理，只有摄像头分辨率变化时才重新创建，并把BGR帧写入纹理"""
+        h, w = frame.shape[:2]
+        if self.texture_size != (w, h):
+            self.texture = Texture.create(size=(w, h), colorfmt="bgr")
+            self.texture.flip_vertical()
+            self.texture_size = (w, h)
+            self.camera_image.texture = self.texture
+        # blit_buffer只接受bytes或一维缓冲区，(h, w, 3)的帧要先展平(连续数组展平不复制)
+        self.texture.blit_buffer(np.ascontiguousarray(frame).reshape(-1), colorfmt="bgr", bufferfmt="ubyte")
+        return self.texture
+
     def update_frame(self, dt):
         ret, frame = self.capture.read()
         if ret:
@@ -172,10 +468,9 @@ class CameraLayout(BoxLayout):
             radius = min(w, h) // 3
             cv2.circle(frame, center, radius, (255, 255, 255), 2)
             # 将 OpenCV 图像转换为 Kivy 纹理
-            buf = cv2.flip(frame, 0).tobytes()
-            texture = Texture.create(size=(w, h), colorfmt="bgr")
-            texture.blit_buffer(buf, colorfmt="bgr", bufferfmt="ubyte")
-            self.camera_image.texture = texture
+            # 复用缓存的纹理(纹理上垂直翻转，不再需要cv2.flip复制)
+            self.get_texture(frame)
+            self.camera_image.canvas.ask_update()
             # 更新进度条
             self.update_progress_circle()
 
@@ -247,22 +542,17 @@ class CameraLayout(BoxLayout):
         # 执行识别逻辑
         ret, frame = self.capture.read()
         if ret:
-            # 保存当前帧为临时文件
-            temp_filename = "temp_capture.png"
-            cv2.imwrite(temp_filename, frame)
-            # 读取临时文件
-            current_image = cv2.imread(temp_filename, cv2.IMREAD_GRAYSCALE)
-            # 遍历本地图像进行比对
+            # 直接在内存中转换为灰度图，不再写入/读取临时文件
+            current_image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            # 只对当前帧提取一次描述符
+            probe_count, probe_descriptors = extract_descriptors(current_image)
+            # 在图库描述符索引中查找（假设本地图像存储在 local_images 文件夹中）
             match_found = False
             matched_name = None
-            for filename in os.listdir("local_images"):  # 假设本地图像存储在 local_images 文件夹中
-                if filename.endswith(".png"):
-                    local_image = cv2.imread(os.path.join("local_images", filename), cv2.IMREAD_GRAYSCALE)
-                    similarity = compare_images(current_image, local_image)
-                    if similarity > 0.5:  # 相似度阈值
-                        match_found = True
-                        matched_name = filename.split("_")[0]  # 假设文件名格式为 "name_id_hand_count.png"
-                        break
+            best_filename, similarity = _descriptor_index.query(probe_count, probe_descriptors)
+            if best_filename is not None and similarity > 0.5:  # 相似度阈值
+                match_found = True
+                matched_name = best_filename.split("_")[0]  # 假设文件名格式为 "name_id_hand_count.png"
             # 显示识别结果
             if match_found:
                 self.hint_label.text = "Recognition successful!"
@@ -299,6 +589,7 @@ class MainApp(App):
     def on_stop(self):
         # 释放摄像头资源
         self.root.capture.release()
+        _descriptor_index.stop()
 
 
 if __name__ == "__main__":
@@ -27,6 +27,16 @@ import os
 import pyttsx3
 
 
+# 采集质量检查：取景框缩小到QUALITY_SIZE后计算，阈值与摄像头分辨率无关
+QUALITY_SIZE = 128
+MIN_SHARPNESS = 60.0  # 拉普拉斯方差下限(对焦/运动模糊)
+BRIGHTNESS_RANGE = (60, 200)  # 圆内平均亮度范围
+MAX_CLIPPED_RATIO = 0.05  # 过暗/过曝像素占比上限
+MIN_PALM_COVERAGE = 0.6  # 圆内肤色像素占比下限
+# 自动采集时检查画面的间隔(秒)，合格即采集
+AUTO_CAPTURE_INTERVAL = 0.3
+
+
 class CapturePopup(Popup):
     """
     采集弹窗 - 用于用户注册
@@ -82,6 +92,37 @@ class CapturePopup(Popup):
             self.confirm_button.background_color = [0.5, 0.5, 0.5, 1]  # 灰色表示不可用
 
 
+def check_capture_quality(frame):
+    """
+    采集质量检查(清晰度、曝光、手掌覆盖率)，在缩小的取景框上计算，只需几毫秒
+    
+    参数：
+        frame: 摄像头BGR整帧图像
+        
+    返回：
+        tuple: (是否合格, 不合格时给用户的提示)
+    """
+    h, w = frame.shape[:2]
+    radius = min(w, h) // 3  # 与引导圆圈一致
+    roi = frame[h // 2 - radius:h // 2 + radius, w // 2 - radius:w // 2 + radius]
+    small = cv2.resize(roi, (QUALITY_SIZE, QUALITY_SIZE), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    mask = np.zeros((QUALITY_SIZE, QUALITY_SIZE), dtype=np.uint8)
+    cv2.circle(mask, (QUALITY_SIZE // 2, QUALITY_SIZE // 2), QUALITY_SIZE // 2 - 1, 255, -1)
+    inside = mask > 0
+    pixels = gray[inside]
+    skin = cv2.inRange(cv2.cvtColor(small, cv2.COLOR_BGR2YCrCb), (0, 133, 77), (255, 173, 127))
+    if np.count_nonzero(skin[inside]) / pixels.size < MIN_PALM_COVERAGE:
+        return False, "Place your whole palm inside the circle"
+    if pixels.mean() < BRIGHTNESS_RANGE[0]:
+        return False, "Too dark"
+    if pixels.mean() > BRIGHTNESS_RANGE[1] or np.mean((pixels <= 5) | (pixels >= 250)) > MAX_CLIPPED_RATIO:
+        return False, "Too bright"
+    if cv2.Laplacian(gray, cv2.CV_64F)[inside].var() < MIN_SHARPNESS:
+        return False, "Image blurred, hold your palm still"
+    return True, None
+
+
 def compare_images(image1, image2):
     """
     图像比对函数(使用OpenCV)
@@ -213,6 +254,9 @@ class CameraLayout(FloatLayout):
         
         # 初始化摄像头
         self.capture = cv2.VideoCapture(0)
+        # 画面纹理缓存(按分辨率复用)
+        self.texture = None
+        self.texture_size = None
         Clock.schedule_interval(self.update_frame, 1.0 / 30.0)  # 30fps更新
         
         # 采集状态
@@ -280,7 +324,7 @@ class CameraLayout(FloatLayout):
     def start_auto_capture(self):
         """
         启动自动采集定时器
-        每2秒自动采集一张图像
+        每AUTO_CAPTURE_INTERVAL秒检查一次画面，通过质量检查即采集
         """
         # 取消之前的定时器(如果有)
         if self.auto_capture_event:
@@ -288,8 +332,7 @@ class CameraLayout(FloatLayout):
         if self.switch_hand_event:
             self.switch_hand_event.cancel()
         
-        # 每2秒自动采集一次
-        self.auto_capture_event = Clock.schedule_interval(self.capture_image, 2)
+        self.auto_capture_event = Clock.schedule_interval(self.capture_image, AUTO_CAPTURE_INTERVAL)
 
     def capture_image(self, dt=None):
         """自动采集并保存手掌图像"""
@@ -298,6 +341,11 @@ class CameraLayout(FloatLayout):
             
         ret, frame = self.capture.read()
         if ret:
+            # 模糊、曝光不当或手掌不在圆内的画面不保存，等下一次检查
+            passed, reason = check_capture_quality(frame)
+            if not passed:
+                self.hint_label.text = f"{reason} ({self.capture_count}/10)"
+                return
             # 创建存储目录(如果不存在)
             if not os.path.exists("local_images"):
                 os.makedirs("local_images")
@@ -335,10 +383,8 @@ class CameraLayout(FloatLayout):
         """识别当前手掌图像"""
         ret, frame = self.capture.read()
         if ret:
-            # 保存临时图像用于比对
-            temp_filename = "temp_capture.png"
-            cv2.imwrite(temp_filename, frame)
-            current_image = cv2.imread(temp_filename, cv2.IMREAD_GRAYSCALE)
+            # 直接在内存中转换为灰度图用于比对，不再写入/读取临时文件
+            current_image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             
             match_found = False
             matched_name = None
@@ -408,6 +454,18 @@ class CameraLayout(FloatLayout):
             self.button_container.opacity = 0
             self.hint_label.opacity = 0
 
+    def get_texture(self, frame):
+        """按画面尺寸缓存纹理，只有摄像头分辨率变化时才重新创建，并把BGR帧写入纹理"""
+        h, w = frame.shape[:2]
+        if self.texture_size != (w, h):
+            self.texture = Texture.create(size=(w, h), colorfmt="bgr")
+            self.texture.flip_vertical()
+            self.texture_size = (w, h)
+            self.camera_image.texture = self.texture
+        # blit_buffer只接受bytes或一维缓冲区，(h, w, 3)的帧要先展平(连续数组展平不复制)
+        self.texture.blit_buffer(np.ascontiguousarray(frame).reshape(-1), colorfmt="bgr", bufferfmt="ubyte")
+        return self.texture
+
     def update_frame(self, dt):
         """更新摄像头画面"""
         ret, frame = self.capture.read()
@@ -419,10 +477,9 @@ class CameraLayout(FloatLayout):
             cv2.circle(frame, center, radius, (255, 255, 255), 2)  # 白色圆圈
             
             # 转换为纹理显示
-            buf = cv2.flip(frame, 0).tobytes()
-            texture = Texture.create(size=(w, h), colorfmt="bgr")
-            texture.blit_buffer(buf, colorfmt="bgr", bufferfmt="ubyte")
-            self.camera_image.texture = texture
+            # 复用缓存的纹理(纹理上垂直翻转，不再需要cv2.flip复制)
+            self.get_texture(frame)
+            self.camera_image.canvas.ask_update()
             
             # 更新进度条
             if self.is_capturing:
@@ -230,6 +230,9 @@ class CameraLayout(FloatLayout):
         
         # 初始化摄像头
         self.capture = cv2.VideoCapture(0)
+        # 画面纹理缓存(按分辨率复用)
+        self.texture = None
+        self.texture_size = None
         Clock.schedule_interval(self.update_frame, 1.0 / 30.0)  # 30fps更新
         
         # 采集状态
@@ -336,10 +339,8 @@ class CameraLayout(FloatLayout):
         """识别当前手掌图像"""
         ret, frame = self.capture.read()
         if ret:
-            # 保存临时图像用于比对
-            temp_filename = "temp_capture.png"
-            cv2.imwrite(temp_filename, frame)
-            current_image = cv2.imread(temp_filename, cv2.IMREAD_GRAYSCALE)
+            # 直接在内存中转换为灰度图用于比对，不再写入/读取临时文件
+            current_image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             match_found = False
             matched_name = None
             # 与存储的所有图像比对
@@ -384,6 +385,18 @@ class CameraLayout(FloatLayout):
         self.hint_label.opacity = 0
         self.action_buttons.opacity = 0  # 隐藏按钮
 
+    def get_texture(self, frame):
+        """按画面尺寸缓存纹理，只有摄像头分辨率变化时才重新创建，并把BGR帧写入纹理"""
+        h, w = frame.shape[:2]
+        if self.texture_size != (w, h):
+            self.texture = Texture.create(size=(w, h), colorfmt="bgr")
+            self.texture.flip_vertical()
+            self.texture_size = (w, h)
+            self.camera_image.texture = self.texture
+        # blit_buffer只接受bytes或一维缓冲区，(h, w, 3)的帧要先展平(连续数组展平不复制)
+        self.texture.blit_buffer(np.ascontiguousarray(frame).reshape(-1), colorfmt="bgr", bufferfmt="ubyte")
+        return self.texture
+
     def update_frame(self, dt):
         """更新摄像头画面"""
         ret, frame = self.capture.read()
@@ -394,10 +407,9 @@ class CameraLayout(FloatLayout):
             radius = min(w, h) // 3  # 半径为图像短边的1/3
             cv2.circle(frame, center, radius, (255, 255, 255), 2)  # 白色圆圈
             # 转换为纹理显示
-            buf = cv2.flip(frame, 0).tobytes()
-            texture = Texture.create(size=(w, h), colorfmt="bgr")
-            texture.blit_buffer(buf, colorfmt="bgr", bufferfmt="ubyte")
-            self.camera_image.texture = texture
+            # 复用缓存的纹理(纹理上垂直翻转，不再需要cv2.flip复制)
+            self.get_texture(frame)
+            self.camera_image.canvas.ask_update()
             # 更新进度条
             if self.is_capturing:
                 center_x = self.camera_image.center_x
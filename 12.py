@@ -19,8 +19,6 @@ from kivy.uix.label import Label
 from kivy.uix.image import Image
 from kivy.uix.popup import Popup
 from kivy.uix.textinput import TextInput
-from kivy.uix.scrollview import ScrollView
-from kivy.uix.gridlayout import GridLayout
 from kivy.graphics import Rectangle, Color, Ellipse, Line
 from kivy.clock import Clock
 from kivy.graphics.texture import Texture
@@ -28,16 +26,147 @@ from kivy.core.window import Window
 from kivy.uix.floatlayout import FloatLayout
 from kivy.graphics import RoundedRectangle
 from kivy.uix.screenmanager import ScreenManager, Screen
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.properties import StringProperty, ObjectProperty
+from kivy.core.audio import SoundLoader
 import cv2
 import numpy as np
 import re
 import os
-import pyttsx3
 import glob
 import json
-from collections import OrderedDict
+import hashlib
+import multiprocessing
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+
+
+
+# 特征模板边长(灰度图缩放到 FEATURE_SIZE x FEATURE_SIZE 后展开为向量)
+FEATURE_SIZE = 32
+FEATURE_DIM = FEATURE_SIZE * FEATURE_SIZE
+# 特征库持久化文件(定长记录的二进制模板文件，启动时内存映射读取)；旧版npz文件只用于迁移
+GALLERY_FILE = "feature_gallery.bin"
+LEGACY_GALLERY_FILE = "feature_gallery.npz"
+GALLERY_MAGIC = b"PALMTPL2"  # 版本2：特征取自圆形取景框的外接正方形
+# 模板记录：身份证号、图片路径(UTF-8，定长)和特征向量
+TEMPLATE_RECORD = np.dtype([('user_id', 'S32'), ('path', 'S128'), ('feature', '<f4', (FEATURE_DIM,))])
+# 用户数据存储后端: "json"(快照+日志，默认) 或 "sqlite"
+USER_STORE_BACKEND = "json"
+USER_DB_FILE = "user_data.db"
+# 语音提示：语速和固定提示语(启动时预先合成为音频，之后直接播放)
+SPEECH_RATE = 150
+SPEECH_CACHE_DIR = "audio_cache"
+FIXED_PROMPTS = ("识别成功!", "识别失败!")
+SPEECH_POLL_INTERVAL = 0.02  # 播报期间驱动语音引擎事件循环的间隔(秒)
+SPEECH_RENDER_TIMEOUT = 10  # 预合成一条提示语最多等待的时间(秒)
+# 用户管理界面每页加载的用户数
+USER_PAGE_SIZE = 50
+# 用户数据日志累计多少条后合并进快照文件
+JOURNAL_COMPACT_EVERY = 200
+# 是否保留识别时的待识别图像用于审计(由后台线程异步写入，不影响识别耗时)
+SAVE_RECOGNITION_PROBES = False
+PROBE_AUDIT_DIR = "probe_audit"
+# 取景框外接正方形在圆外额外保留的像素(容纳白色边框)
+ROI_MARGIN = 2
+# 摄像头配置：按优先顺序尝试的像素格式，以及预览/采集模式的(宽, 高, 帧率)候选
+# 预览使用较低分辨率保证帧率，注册采集时切换到较高分辨率
+# 两者都用4:3：取景框按画面短边取比例，比例相同时注册图像和识别画面覆盖相同的视野
+# (16:9模式多由传感器上下裁切得到，同样的取景框会对应更小的视野和更大的手掌)
+CAMERA_PROFILE = {
+    "fourcc": ("MJPG", "YUYV"),
+    "preview": ((640, 480, 30), (800, 600, 30), (640, 480, 15)),
+    "capture": ((1280, 960, 15), (1024, 768, 15), (640, 480, 30)),
+}
+# 画面刷新：有动静时全速刷新，连续IDLE_TIMEOUT秒无变化后降到IDLE_FPS
+PREVIEW_FPS = 30
+IDLE_FPS = 4
+IDLE_TIMEOUT = 5.0
+# 运动检测：取景框缩小到MOTION_SIZE x MOTION_SIZE灰度图后与上一帧比较，平均差值超过阈值视为有运动
+MOTION_SIZE = 32
+MOTION_THRESHOLD = 6.0
+# 采集质量检查：取景框缩小到QUALITY_SIZE后计算，阈值与摄像头分辨率无关
+QUALITY_SIZE = 128
+MIN_SHARPNESS = 60.0  # 拉普拉斯方差下限(对焦/运动模糊)
+BRIGHTNESS_RANGE = (60, 200)  # 圆内平均亮度范围
+MAX_CLIPPED_RATIO = 0.05  # 过暗/过曝像素占比上限
+MIN_PALM_COVERAGE = 0.6  # 圆内肤色像素占比下限
+# 自动采集：两次采集的最短间隔，以及换手后的等待时间(秒)
+AUTO_CAPTURE_INTERVAL = 0.3
+HAND_SWITCH_PAUSE = 3.0
+# 连拍采集：每次从采集线程缓冲区取最近BURST_SIZE帧，只保存其中最清晰的一帧
+BURST_SIZE = 4
+# 与同一只手已采集图像的特征相似度超过该值时视为重复，不保存
+DUPLICATE_SIMILARITY = 0.97
+# 多进程比对：工作进程数，以及特征行数达到多少时才分片到多个进程(行数少时进程间通信不划算)
+MATCH_WORKERS = os.cpu_count() or 1
+PARALLEL_MATCH_MIN_ROWS = 20000
+
+
+def palm_roi_bounds(h, w):
+    """
+    计算圆形取景框的外接正方形
+    参数：
+        h, w: 整帧图像的高和宽
+    返回：
+        tuple: (左上角x, 左上角y, 边长, 圆半径)，圆心位于正方形中心
+    """
+    radius = min(w, h) // 3  # 半径为图像短边的1/3
+    size = 2 * (radius + ROI_MARGIN)
+    return w // 2 - size // 2, h // 2 - size // 2, size, radius
+
+
+def crop_palm_roi(frame):
+    """裁剪出圆形取景框的外接正方形(返回视图，不复制)"""
+    x0, y0, size, _ = palm_roi_bounds(*frame.shape[:2])
+    return frame[y0:y0 + size, x0:x0 + size]
 
 
+def load_palm_image(image_path):
+    """读取灰度掌纹图像；旧版本保存的是整帧图像(非正方形)，读取后裁剪到取景框"""
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if image is not None and image.shape[0] != image.shape[1]:
+        image = crop_palm_roi(image)
+    return image
+
+
+def extract_features(image):
+    """
+    提取掌纹特征向量
+    参数：
+        image: BGR彩色图像或灰度图像
+    返回：
+        np.ndarray: 去均值并L2归一化的float32向量(长度FEATURE_DIM)
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (FEATURE_SIZE, FEATURE_SIZE), interpolation=cv2.INTER_AREA)
+    vector = small.astype(np.float32).ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def compare_features(feature1, feature2):
+    """
+    特征向量比对函数
+    参数：
+        feature1: 第一个特征向量
+        feature2: 第二个特征向量
+    返回：
+        float: 相似度得分(0-1之间，余弦相似度负值截断为0)
+    """
+    return max(float(np.dot(feature1, feature2)), 0.0)
 
 
 def compare_images(image1, image2):
@@ -49,8 +178,943 @@ def compare_images(image1, image2):
     返回：
         float: 相似度得分(0-1之间)
     """
-    # 这里为演示返回1(100%匹配)
-    return 1
+    return compare_features(extract_features(image1), extract_features(image2))
+
+
+def batch_compare(probe, features):
+    """
+    批量比对函数 - 一次矩阵运算得到probe与所有模板的相似度
+    参数：
+        probe: 待识别图像的特征向量(FEATURE_DIM,)
+        features: 模板特征矩阵(N, FEATURE_DIM)
+    返回：
+        np.ndarray: (N,) 相似度得分(0-1之间)，与compare_features逐个计算结果一致
+    """
+    scores = features @ probe
+    np.maximum(scores, 0, out=scores)
+    return scores
+
+
+def read_camera_mode(capture):
+    """读取摄像头当前实际生效的模式"""
+    code = int(capture.get(cv2.CAP_PROP_FOURCC))
+    return {
+        "fourcc": "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)),
+        "width": int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": capture.get(cv2.CAP_PROP_FPS),
+    }
+
+
+def negotiate_camera_mode(capture, fourccs, modes):
+    """
+    依次尝试分辨率/帧率和像素格式组合，选用第一个驱动实际接受的模式
+    参数：
+        capture: 已打开的cv2.VideoCapture
+        fourccs: 按优先顺序排列的像素格式，如("MJPG", "YUYV")
+        modes: 按优先顺序排列的(宽, 高, 帧率)
+    返回：
+        dict: 实际生效的模式
+        像素格式都不被接受(MSMF、DSHOW等常报告与请求不同的格式)时，退回第一个分辨率生效的候选；
+        分辨率也都不生效时重新设置第一个候选，而不是停在最后尝试的(最慢的)模式上
+    """
+    fallback = None
+    for width, height, fps in modes:
+        for fourcc in fourccs:
+            _set_camera_mode(capture, fourcc, width, height, fps)
+            mode = read_camera_mode(capture)
+            # 不少驱动不报告帧率，只要求分辨率和像素格式一致
+            if (mode["width"], mode["height"], mode["fourcc"]) == (width, height, fourcc):
+                return mode
+            if fallback is None and (mode["width"], mode["height"]) == (width, height):
+                fallback = (fourcc, width, height, fps)
+    if fallback is None:
+        fallback = (fourccs[0],) + tuple(modes[0])
+        print(f"摄像头模式协商失败，没有候选分辨率生效，使用 {fallback[0]} {fallback[1]}x{fallback[2]}")
+    else:
+        print(f"摄像头像素格式协商失败，按分辨率使用 {fallback[1]}x{fallback[2]} @ {fallback[3]}fps")
+    _set_camera_mode(capture, *fallback)
+    return read_camera_mode(capture)
+
+
+def _set_camera_mode(capture, fourcc, width, height, fps):
+    capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    capture.set(cv2.CAP_PROP_FPS, fps)
+
+
+def describe_camera_mode(mode):
+    return f"{mode['fourcc'].strip() or '未知格式'} {mode['width']}x{mode['height']} @ {mode['fps']:.0f}fps"
+
+
+class FrameGrabber:
+    """
+    摄像头采集线程 - 在后台打开摄像头并持续读取，最新的若干帧保存在环形缓冲区中
+    属性：
+        source: 摄像头编号
+        profile: 摄像头配置(见CAMERA_PROFILE)
+        capture: cv2.VideoCapture对象(在采集线程中打开、协商模式和读取)
+        modes: 模式名("preview"/"capture") -> 协商得到的实际模式
+        frames: 环形缓冲区，元素为(时间戳, 帧序号, 图像)
+        ready: 摄像头打开(或打开失败)后置位
+    """
+    def __init__(self, source=0, buffer_size=4, profile=CAMERA_PROFILE):
+        self.source = source
+        self.profile = profile
+        self.capture = None
+        self.opened = False
+        self.modes = {}
+        self.mode_name = None  # 当前生效的模式名
+        self._requested_mode = "preview"
+        self.min_interval = 0  # 两次解码之间的最短间隔(秒)，空闲时由界面调大
+        self._last_retrieve = 0
+        self.ready = threading.Event()
+        self.frames = deque(maxlen=buffer_size)
+        self.frame_id = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """启动采集线程"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        停止采集线程
+        摄像头只由采集线程在退出循环后释放：线程可能仍阻塞在grab()中，从这里释放会和读取并发
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            if self._thread.is_alive():
+                print("摄像头采集线程未能及时退出，摄像头将在线程退出时释放")
+            self._thread = None
+
+    def set_mode(self, name):
+        """请求切换到预览("preview")或采集("capture")模式，由采集线程在下一帧前完成切换"""
+        self._requested_mode = name
+
+    def _apply_mode(self, name):
+        """协商并切换摄像头模式(只在采集线程中调用)"""
+        if name not in self.modes:
+            mode = negotiate_camera_mode(self.capture, self.profile["fourcc"], self.profile[name])
+            preview = self.modes.get("preview")
+            if preview is not None and mode["width"] * preview["height"] != mode["height"] * preview["width"]:
+                # 驱动给出的比例与预览不同时改用预览模式，保证注册和识别的取景框视野一致
+                print(f"摄像头采集模式 {describe_camera_mode(mode)} 与预览画面比例不同，采集改用预览模式")
+                mode = preview
+                self._set_mode(mode)
+            self.modes[name] = mode
+            print(f"摄像头{'预览' if name == 'preview' else '采集'}模式: {describe_camera_mode(mode)}")
+        else:
+            self._set_mode(self.modes[name])
+        self.mode_name = name
+
+    def _set_mode(self, mode):
+        """重新设置一个已协商过的模式"""
+        negotiate_camera_mode(self.capture, (mode["fourcc"],), ((mode["width"], mode["height"], mode["fps"]),))
+
+    def _run(self):
+        # 打开摄像头和协商模式可能耗时数秒，放在采集线程中完成
+        self.capture = cv2.VideoCapture(self.source)
+        self.opened = self.capture.isOpened()
+        if not self.opened:
+            print(f"打开摄像头失败: {self.source}")
+        else:
+            self._apply_mode("preview")
+        self.ready.set()
+        while self._running:
+            if self.opened and self._requested_mode != self.mode_name:
+                self._apply_mode(self._requested_mode)
+            if not self.capture.grab():
+                time.sleep(0.01)  # 摄像头暂时无画面，避免空转
+                continue
+            now = time.time()
+            if now - self._last_retrieve < self.min_interval:
+                continue  # 空闲时只取出驱动缓冲，不解码
+            ret, frame = self.capture.retrieve()
+            if not ret:
+                continue
+            self._last_retrieve = now
+            with self._lock:
+                self.frame_id += 1
+                self.frames.append((time.time(), self.frame_id, frame))
+        # 摄像头在采集线程中打开，也只在这里释放(stop()只负责通知和等待)
+        if self.capture.isOpened():
+            self.capture.release()
+
+    def latest(self):
+        """获取最新一帧(时间戳, 帧序号, 图像)，不阻塞；尚无画面时返回None"""
+        with self._lock:
+            return self.frames[-1] if self.frames else None
+
+    def recent(self, count):
+        """获取最近count帧(从旧到新)"""
+        with self._lock:
+            return list(self.frames)[-count:]
+
+
+class MotionDetector:
+    """
+    运动检测 - 缩小后的灰度图与上一帧逐像素比较，每帧开销不到1毫秒
+    属性：
+        size: 比较用的图像边长
+        threshold: 平均灰度差阈值
+    """
+    def __init__(self, size=MOTION_SIZE, threshold=MOTION_THRESHOLD):
+        self.size = size
+        self.threshold = threshold
+        self._previous = None
+
+    def update(self, frame):
+        """输入新的一帧，返回与上一帧相比是否有运动"""
+        small = cv2.resize(frame, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        previous, self._previous = self._previous, small
+        if previous is None:
+            return True
+        return float(cv2.absdiff(small, previous).mean()) > self.threshold
+
+
+class FrameQualityGate:
+    """
+    采集质量检查 - 在缩小的取景框上计算清晰度、曝光和手掌覆盖率，每帧只需几毫秒
+    属性：
+        size: 计算用的图像边长
+        mask: 圆形区域蒙版
+    """
+    def __init__(self, size=QUALITY_SIZE):
+        self.size = size
+        self.mask = np.zeros((size, size), dtype=np.uint8)
+        cv2.circle(self.mask, (size // 2, size // 2), size // 2 - 1, 255, -1)
+        self._inside = self.mask > 0
+        self._area = int(np.count_nonzero(self.mask))
+        self._results = {}  # 帧序号 -> 检查结果(只保留上一组连拍画面的)
+
+    def score(self, roi):
+        """
+        计算质量指标
+        参数：
+            roi: 取景框区域的BGR图像
+        返回：
+            dict: sharpness(拉普拉斯方差), brightness(平均亮度), clipped(过暗/过曝占比), coverage(肤色占比)
+        """
+        small = cv2.resize(roi, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        pixels = gray[self._inside]
+        skin = cv2.inRange(cv2.cvtColor(small, cv2.COLOR_BGR2YCrCb), (0, 133, 77), (255, 173, 127))
+        return {
+            "sharpness": float(cv2.Laplacian(gray, cv2.CV_64F)[self._inside].var()),
+            "brightness": float(pixels.mean()),
+            "clipped": float(np.mean((pixels <= 5) | (pixels >= 250))),
+            "coverage": float(np.count_nonzero(cv2.bitwise_and(skin, self.mask)) / self._area),
+        }
+
+    def check(self, roi):
+        """
+        判断是否达到采集要求
+        返回：
+            tuple: (是否合格, 不合格时给用户的提示)
+        """
+        passed, reason, _ = self._evaluate(roi)
+        return passed, reason
+
+    def _evaluate(self, roi):
+        quality = self.score(roi)
+        if quality["coverage"] < MIN_PALM_COVERAGE:
+            return False, "请将手掌完全放入圆圈内", quality
+        if quality["brightness"] < BRIGHTNESS_RANGE[0]:
+            return False, "光线太暗", quality
+        if quality["brightness"] > BRIGHTNESS_RANGE[1] or quality["clipped"] > MAX_CLIPPED_RATIO:
+            return False, "光线太亮", quality
+        if quality["sharpness"] < MIN_SHARPNESS:
+            return False, "画面模糊，请保持手掌稳定", quality
+        return True, None, quality
+
+    def select_best(self, frames):
+        """
+        从连拍的一组画面中选出最清晰的合格画面
+        不合格时每次界面刷新都会重新选择，上一组里已检查过的帧直接使用缓存的结果
+        参数：
+            frames: (帧序号, 取景框区域的BGR图像)列表(从旧到新)
+        返回：
+            tuple: (最佳画面, None)；都不合格时返回(None, 最新一帧的不合格提示)
+        """
+        best, best_sharpness, reason = None, -1.0, None
+        results = {}
+        for frame_id, frame in frames:
+            result = self._results.get(frame_id)
+            if result is None:
+                result = self._evaluate(frame)
+            results[frame_id] = result
+            passed, reason, quality = result
+            if passed and quality["sharpness"] > best_sharpness:
+                best, best_sharpness = frame, quality["sharpness"]
+        self._results = results
+        return (best, None) if best is not None else (None, reason)
+
+
+class SpeechService:
+    """
+    语音播报服务 - pyttsx3在独立线程中运行，界面线程只负责入队，不再等待runAndWait
+        合并：同一提示语尚在队列中时不重复入队
+        打断：新提示到来时，队列中较早的提示直接跳过，正在播报的立即停止
+        预合成：固定提示语启动时合成为音频文件，之后由界面线程直接播放
+        事件循环：引擎只在播报线程中创建和使用，用startLoop(False)/iterate()驱动，
+            不在非主线程反复进出runAndWait(部分驱动在非主线程的runAndWait中会卡住或崩溃)
+    平台限制：macOS的nsss驱动依赖主线程的NSRunLoop，在播报线程中收不到播报结束的通知，
+        第一条提示之后引擎一直处于忙碌状态，后续合成语音不会播出(界面不受影响)
+    """
+    def __init__(self, rate=SPEECH_RATE, prompts=FIXED_PROMPTS, cache_dir=SPEECH_CACHE_DIR):
+        self.rate = rate
+        self.prompts = prompts
+        self.cache_dir = cache_dir
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = set()  # 队列中尚未播报且未过期的提示语(最多只有最新的一条)
+        self._generation = 0  # 每个新提示递增，序号较小的即为过期提示
+        self._speaking_generation = 0
+        self._engine = None
+        self._clips = {}  # 提示语 -> 预合成的Sound(只在界面线程中访问)
+        self._current_clip = None
+        self.ready = threading.Event()  # 语音引擎初始化完成(或失败)后置位
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def say(self, text):
+        """播报提示语(界面线程调用，立即返回)"""
+        clip = self._clips.get(text)
+        if clip is not None:
+            self._interrupt()
+            if self._current_clip is not clip or clip.state != 'play':
+                self._current_clip = clip
+                clip.play()
+            return
+        with self._lock:
+            if text in self._pending:
+                return  # 与最新一条排队中的提示相同，合并
+            if self._current_clip is not None:
+                self._current_clip.stop()
+            # 新提示使之前排队的提示全部过期，只记录这一条
+            self._generation += 1
+            self._pending = {text}
+            self._queue.put((self._generation, text))
+
+    def stop(self):
+        """停止服务"""
+        self._interrupt()
+        self._queue.put(None)
+
+    def _interrupt(self):
+        """让排队中和正在播报的合成语音过期"""
+        with self._lock:
+            self._generation += 1
+            self._pending.clear()
+        if self._current_clip is not None:
+            self._current_clip.stop()
+
+    def _clip_path(self, text):
+        key = hashlib.md5(f"{self.rate}:{text}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _run(self):
+        try:
+            import pyttsx3  # 延迟导入，加载语音驱动不占用启动时间
+            self._engine = pyttsx3.init()
+            self._engine.setProperty("rate", self.rate)  # 语速设置
+            self._engine.connect('started-word', self._on_word)
+            self._engine.startLoop(False)  # 事件循环由本线程调用iterate驱动
+            self._engine.iterate()  # 第一次iterate让驱动进入空闲状态
+        except Exception as e:
+            print(f"初始化语音引擎失败: {e}")
+            self.ready.set()
+            return
+        self._prerender()
+        self.ready.set()
+        while True:
+            if self._engine.isBusy():
+                # 播报中：定时驱动事件循环，同时接收新提示
+                try:
+                    item = self._queue.get(timeout=SPEECH_POLL_INTERVAL)
+                except queue.Empty:
+                    item = ()
+            else:
+                item = self._queue.get()
+            if item is None:
+                break
+            if item:
+                self._speak(*item)
+            self._iterate()
+        try:
+            self._engine.endLoop()
+        except Exception as e:
+            print(f"关闭语音引擎失败: {e}")
+
+    def _speak(self, generation, text):
+        with self._lock:
+            if generation != self._generation:
+                return  # 已有更新的提示，跳过(过期提示不影响_pending中最新的那条)
+            self._pending.discard(text)
+            self._speaking_generation = generation
+        try:
+            if self._engine.isBusy():
+                self._engine.stop()  # 正在播报的提示已过期
+            self._engine.say(text)
+        except Exception as e:
+            print(f"语音播报失败: {e}")
+
+    def _iterate(self):
+        try:
+            self._engine.iterate()
+        except Exception as e:
+            print(f"语音播报失败: {e}")
+
+    def _wait_idle(self, timeout):
+        """驱动事件循环直到引擎空闲或超时"""
+        deadline = time.time() + timeout
+        while self._engine.isBusy() and time.time() < deadline:
+            self._iterate()
+            time.sleep(SPEECH_POLL_INTERVAL)
+
+    def _on_word(self, name, location, length):
+        """播报过程中发现有新提示时停止当前播报"""
+        if self._speaking_generation != self._generation:
+            self._engine.stop()
+
+    def _prerender(self):
+        """把固定提示语合成为音频文件(已有缓存时跳过)，再交给界面线程加载"""
+        for text in self.prompts:
+            path = self._clip_path(text)
+            try:
+                if not os.path.exists(path):
+                    if not os.path.exists(self.cache_dir):
+                        os.makedirs(self.cache_dir, exist_ok=True)
+                    self._engine.save_to_file(text, path)
+                    self._wait_idle(SPEECH_RENDER_TIMEOUT)
+                if os.path.exists(path) and os.path.getsize(path) > 0:
+                    Clock.schedule_once(lambda dt, t=text, p=path: self._load_clip(t, p))
+            except Exception as e:
+                print(f"预合成提示语失败: {e}")
+
+    def _load_clip(self, text, path):
+        sound = SoundLoader.load(path)
+        if sound is not None:
+            self._clips[text] = sound
+
+
+class AsyncImageWriter:
+    """
+    异步图片写入器 - 在后台线程中执行cv2.imwrite，避免PNG编码阻塞界面线程
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, path, image, on_saved=None, callback=None):
+        """
+        提交写入任务
+        参数：
+            path: 目标文件路径(目录不存在时自动创建)
+            image: 要保存的图像(提交后调用方不应再修改)
+            on_saved: 写入成功后在后台线程中执行的函数(如记录到用户数据)，无参数
+            callback: 任务完成后通过Clock回到界面线程执行，参数为(path, success)
+        """
+        self._queue.put((path, image, on_saved, callback))
+
+    def run_after_writes(self, func, callback=None):
+        """
+        在已提交的写入全部完成后，由写入线程执行func(无参数)
+        callback: func执行后通过Clock回到界面线程执行，无参数
+        """
+        self._queue.put((None, None, func, callback))
+
+    def flush(self):
+        """等待所有已提交的写入完成"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            path, image, on_saved, callback = self._queue.get()
+            if path is None:
+                self._run_task(on_saved, callback)
+                continue
+            success = False
+            try:
+                directory = os.path.dirname(path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory, exist_ok=True)
+                success = cv2.imwrite(path, image)
+                if not success:
+                    print(f"写入图片失败: {path}")
+                elif on_saved is not None:
+                    on_saved()
+            except Exception as e:
+                success = False
+                print(f"写入图片失败: {e}")
+            finally:
+                if callback is not None:
+                    Clock.schedule_once(lambda dt, ok=success: callback(path, ok))
+                self._queue.task_done()
+
+    def _run_task(self, func, callback):
+        try:
+            func()
+        except Exception as e:
+            print(f"后台任务失败: {e}")
+        finally:
+            if callback is not None:
+                Clock.schedule_once(lambda dt: callback())
+            self._queue.task_done()
+
+
+class SharedGalleryBuffer:
+    """
+    共享内存特征矩阵 - 其他进程按名称映射后直接读取，不需要复制或序列化
+    内存布局：头部(纪元, 行数, 容量)，随后是容量 x FEATURE_DIM 的float32特征和容量个int32用户编号
+    属性：
+        shm: SharedMemory对象
+        features: (容量, FEATURE_DIM) float32 特征视图
+        labels: (容量,) int32 用户编号视图
+    """
+    HEADER_SIZE = 64  # 头部占用字节数(保持特征数据按缓存行对齐)
+
+    def __init__(self, capacity=None, name=None):
+        self.owner = name is None
+        if self.owner:
+            size = self.HEADER_SIZE + capacity * (FEATURE_DIM * 4 + 4)
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        elif sys.version_info >= (3, 13):
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.header = np.ndarray(3, dtype=np.int64, buffer=self.shm.buf)
+        if self.owner:
+            self.header[:] = (0, 0, capacity)
+        capacity = int(self.header[2])
+        self.features = np.ndarray((capacity, FEATURE_DIM), dtype=np.float32,
+                                   buffer=self.shm.buf, offset=self.HEADER_SIZE)
+        self.labels = np.ndarray(capacity, dtype=np.int32, buffer=self.shm.buf,
+                                 offset=self.HEADER_SIZE + capacity * FEATURE_DIM * 4)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def epoch(self):
+        """纪元：每次增删特征后加一，工作进程据此判断自己读到的是否为最新特征库"""
+        return int(self.header[0])
+
+    def publish(self, count):
+        """写入当前行数并递增纪元"""
+        self.header[1] = count
+        self.header[0] += 1
+
+    def close(self):
+        """解除映射，创建者同时释放共享内存"""
+        self.header = self.features = self.labels = None
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except Exception as e:
+            print(f"释放共享特征库失败: {e}")
+
+
+# 工作进程中已映射的共享特征库: 名称 -> SharedGalleryBuffer
+_attached_galleries = {}
+
+
+def _match_shared_rows(name, epoch, probe, start, stop, label_count):
+    """
+    在工作进程中执行：比对共享特征库的[start, stop)行，按用户累加得分
+    返回：
+        tuple: (得分和, 行数) 两个长度为label_count的数组；特征库已变化(纪元不一致)时返回None
+    """
+    shared = _attached_galleries.get(name)
+    if shared is None:
+        # 特征库扩容后换了一块共享内存，旧的映射不再需要
+        for old in _attached_galleries.values():
+            old.close()
+        _attached_galleries.clear()
+        shared = SharedGalleryBuffer(name=name)
+        # 工作进程在主进程创建共享内存之前就已fork，映射时会启动自己的资源跟踪进程；
+        # 不注销的话，工作进程退出(或被杀)时它的跟踪进程会把主进程仍在使用的共享内存删除
+        if sys.version_info < (3, 13):
+            resource_tracker.unregister(shared.shm._name, "shared_memory")
+        _attached_galleries[name] = shared
+    if shared.epoch != epoch:
+        return None
+    scores = batch_compare(probe, shared.features[start:stop])
+    labels = shared.labels[start:stop]
+    sums = np.bincount(labels, weights=scores, minlength=label_count)
+    counts = np.bincount(labels, minlength=label_count)
+    if shared.epoch != epoch:
+        return None
+    return sums, counts
+
+
+class GalleryMatchPool:
+    """
+    多进程比对池 - 特征库按行分段，每个工作进程映射共享内存后只计算自己那一段
+    只在支持fork的系统上启用(spawn方式会在子进程中重新导入本脚本并创建窗口)
+    属性：
+        workers: 工作进程数
+        executor: ProcessPoolExecutor，未启用时为None
+    """
+    def __init__(self, workers=MATCH_WORKERS):
+        self.workers = workers
+        self.executor = None
+
+    def start(self):
+        """创建工作进程，需要在界面启动前、创建特征库之前调用，避免在已有多个线程时fork"""
+        if self.executor is not None or self.workers < 2:
+            return
+        if "fork" not in multiprocessing.get_all_start_methods():
+            return
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=multiprocessing.get_context("fork"))
+        self.executor.submit(os.getpid)  # fork方式下第一次提交任务时一次性创建全部工作进程
+
+    def match(self, shared, count, probe, label_count):
+        """
+        并行计算每个用户的得分和与行数
+        返回：
+            tuple: (得分和, 行数)；未启用或比对期间特征库发生变化时返回None
+        """
+        if self.executor is None:
+            return None
+        bounds = np.linspace(0, count, self.workers + 1).astype(int)
+        try:
+            futures = [self.executor.submit(_match_shared_rows, shared.name, shared.epoch, probe,
+                                            int(start), int(stop), label_count)
+                       for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+            results = [future.result() for future in futures]
+        except Exception as e:
+            print(f"并行比对失败: {e}")
+            self.stop()
+            return None
+        if any(result is None for result in results):
+            return None
+        sums = np.sum([result[0] for result in results], axis=0)
+        counts = np.sum([result[1] for result in results], axis=0)
+        return sums, counts
+
+    def stop(self):
+        """关闭工作进程"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+_match_pool = GalleryMatchPool()
+
+
+class FeatureGallery:
+    """
+    特征库 - 所有已注册图像的特征向量按行连续存放在一块共享内存中
+    属性：
+        features: (N, FEATURE_DIM) float32 特征矩阵
+        user_ids: 每行特征所属用户的身份证号
+        paths: 每行特征对应的图片路径
+    """
+    def __init__(self, gallery_file=GALLERY_FILE):
+        self.gallery_file = gallery_file
+        self._shared = SharedGalleryBuffer(64)  # 预留容量，按倍数扩容
+        self._buffer = self._shared.features
+        self._labels = self._shared.labels  # 每行特征的用户编号，用于按用户聚合得分
+        self.count = 0
+        self.user_ids = []
+        self.paths = []
+        self._label_ids = []  # 用户编号 -> 身份证号
+        self._label_of = {}  # 身份证号 -> 用户编号
+        self._lock = threading.RLock()  # 采集写入线程与识别并发访问时加锁
+        self._load()
+
+    @property
+    def features(self):
+        """当前有效的特征矩阵(连续内存视图，不复制)"""
+        return self._buffer[:self.count]
+
+    def _load(self):
+        """
+        内存映射模板文件并一次性复制到特征矩阵，不再解码图片
+        10万条记录(约400MB特征)约需0.6秒，大部分是首次写入共享内存页的开销，解析和检查记录约0.2秒
+        """
+        dropped = 0
+        try:
+            if os.path.exists(self.gallery_file):
+                records = self._map_records()
+                features = records['feature']
+                user_ids = self._decode_field(records['user_id'])
+                paths = self._decode_field(records['path'])
+                # 逐条检查记录，只丢弃损坏的记录(无法解码的身份证号/路径、非有限值的特征)
+                valid = np.isfinite(features.sum(axis=1))
+                valid &= [uid is not None and path is not None for uid, path in zip(user_ids, paths)]
+                if not valid.all():
+                    keep = np.flatnonzero(valid)
+                    dropped = len(records) - len(keep)
+                    print(f"特征库中有{dropped}条损坏的记录，已跳过")
+                    features = features[keep]
+                    user_ids = [user_ids[i] for i in keep]
+                    paths = [paths[i] for i in keep]
+            elif os.path.exists(LEGACY_GALLERY_FILE):
+                with np.load(LEGACY_GALLERY_FILE) as data:
+                    features = data['features'].astype(np.float32)
+                    user_ids = [str(x) for x in data['user_ids']]
+                    paths = [str(x) for x in data['paths']]
+                if features.ndim != 2 or features.shape[1] != FEATURE_DIM:
+                    raise ValueError("特征维度不匹配")
+            else:
+                features, user_ids, paths = np.empty((0, FEATURE_DIM), dtype=np.float32), [], []
+            self._reserve(len(features))
+            self._buffer[:len(features)] = features
+            self._labels[:len(features)] = [self._label(uid) for uid in user_ids]
+            self.count = len(features)
+            self.user_ids = user_ids
+            self.paths = paths
+            if not os.path.exists(self.gallery_file) and os.path.exists(LEGACY_GALLERY_FILE):
+                # 旧版npz特征库转换为模板文件
+                self._save()
+                os.remove(LEGACY_GALLERY_FILE)
+            elif dropped:
+                # 重写模板文件去掉损坏的记录，缺失的特征之后由sync从图片补建
+                self._save()
+        except Exception as e:
+            print(f"加载特征库失败: {e}")
+            self.count = 0
+            self.user_ids = []
+            self.paths = []
+            if os.path.exists(self.gallery_file):
+                # 文件头无法识别(旧格式或已损坏)的模板文件改名保留，之后由sync从图片重建
+                os.replace(self.gallery_file, self.gallery_file + ".bad")
+        self._shared.publish(self.count)
+
+    @staticmethod
+    def _decode_field(raw):
+        """把定长UTF-8字段解码为字符串列表；无法解码(被截断在多字节字符中间)的记录为None"""
+        values = raw.tolist()  # bytes列表，末尾的填充字节已去掉
+        try:
+            return [value.decode('utf-8') for value in values]
+        except UnicodeDecodeError:
+            decoded = []
+            for value in values:
+                try:
+                    decoded.append(value.decode('utf-8'))
+                except UnicodeDecodeError:
+                    decoded.append(None)
+            return decoded
+
+    def _map_records(self):
+        """内存映射模板文件中的全部完整记录(末尾写了一半的记录会被截掉)"""
+        header = np.fromfile(self.gallery_file, dtype=np.uint8, count=len(GALLERY_MAGIC) + 8).tobytes()
+        if header[:len(GALLERY_MAGIC)] != GALLERY_MAGIC:
+            raise ValueError("模板文件格式错误")
+        dim, itemsize = np.frombuffer(header[len(GALLERY_MAGIC):], dtype='<u4')
+        if dim != FEATURE_DIM or itemsize != TEMPLATE_RECORD.itemsize:
+            raise ValueError("特征维度不匹配")
+        offset = len(header)
+        size = os.path.getsize(self.gallery_file) - offset
+        count = size // TEMPLATE_RECORD.itemsize
+        if size % TEMPLATE_RECORD.itemsize:
+            os.truncate(self.gallery_file, offset + count * TEMPLATE_RECORD.itemsize)
+        if count == 0:
+            return np.empty(0, dtype=TEMPLATE_RECORD)
+        return np.memmap(self.gallery_file, dtype=TEMPLATE_RECORD, mode='r', offset=offset, shape=(count,))
+
+    @staticmethod
+    def _file_header():
+        return GALLERY_MAGIC + np.array([FEATURE_DIM, TEMPLATE_RECORD.itemsize], dtype='<u4').tobytes()
+
+    def _records(self, start, stop):
+        """把[start, stop)行打包成模板记录"""
+        records = np.zeros(stop - start, dtype=TEMPLATE_RECORD)
+        records['user_id'] = [uid.encode('utf-8') for uid in self.user_ids[start:stop]]
+        records['path'] = [path.encode('utf-8') for path in self.paths[start:stop]]
+        records['feature'] = self._buffer[start:stop]
+        return records
+
+    def _save(self):
+        """重写整个模板文件(压缩掉已删除的记录；先写临时文件再替换，避免写入中断损坏)"""
+        try:
+            temp_file = self.gallery_file + ".tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(self._file_header())
+                f.write(self._records(0, self.count).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.gallery_file)
+        except Exception as e:
+            print(f"保存特征库失败: {e}")
+
+    def _append_file(self, start):
+        """把[start, count)行追加到模板文件末尾"""
+        if not os.path.exists(self.gallery_file):
+            self._save()
+            return
+        try:
+            with open(self.gallery_file, 'ab') as f:
+                f.write(self._records(start, self.count).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            print(f"保存特征库失败: {e}")
+
+    def _reserve(self, size):
+        """确保缓冲区至少能容纳size行"""
+        if size > len(self._buffer):
+            capacity = max(size, len(self._buffer) * 2)
+            shared = SharedGalleryBuffer(capacity)
+            shared.features[:self.count] = self.features
+            shared.labels[:self.count] = self._labels[:self.count]
+            shared.publish(self.count)
+            self._buffer = shared.features
+            self._labels = shared.labels
+            self._shared.close()
+            self._shared = shared
+
+    def _label(self, user_id):
+        """获取(必要时分配)用户编号"""
+        if user_id not in self._label_of:
+            self._label_of[user_id] = len(self._label_ids)
+            self._label_ids.append(user_id)
+        return self._label_of[user_id]
+
+    @staticmethod
+    def _check_fields(user_id, image_path):
+        """身份证号或路径超出模板记录的定长字段时拒绝写入(截断会丢失信息，还可能切断多字节字符)"""
+        for label, value, field in (("身份证号", user_id, 'user_id'), ("图片路径", image_path, 'path')):
+            size = len(value.encode('utf-8'))
+            limit = TEMPLATE_RECORD[field].itemsize
+            if size > limit:
+                raise ValueError(f"{label}为{size}字节，超过模板记录的{limit}字节: {value}")
+
+    def _append(self, user_id, image_path, feature):
+        self._check_fields(user_id, image_path)
+        self._reserve(self.count + 1)
+        self._buffer[self.count] = feature
+        self._labels[self.count] = self._label(user_id)
+        self.count += 1
+        self.user_ids.append(user_id)
+        self.paths.append(image_path)
+        self._shared.publish(self.count)
+
+    def _keep_rows(self, keep):
+        """只保留keep中的行(保持原顺序)"""
+        self._buffer[:len(keep)] = self._buffer[keep]
+        self._labels[:len(keep)] = self._labels[keep]
+        self.count = len(keep)
+        self.user_ids = [self.user_ids[i] for i in keep]
+        self.paths = [self.paths[i] for i in keep]
+        self._shared.publish(self.count)
+
+    def add(self, user_id, image_path, image=None, feature=None):
+        """
+        添加一张图像的特征
+        参数：
+            user_id: 用户身份证号
+            image_path: 图片路径
+            image: 已在内存中的图像(为None时从image_path读取)
+            feature: 已提取好的特征(为None时从图像提取)
+        """
+        if feature is None:
+            if image is None:
+                image = load_palm_image(image_path)
+                if image is None:
+                    return False
+            feature = extract_features(image)
+        with self._lock:
+            try:
+                self._append(user_id, image_path, feature)
+            except ValueError as e:
+                print(f"添加特征失败: {e}")
+                return False
+            self._append_file(self.count - 1)
+        return True
+
+    def remove_user(self, user_id):
+        """删除某个用户的全部特征，并压缩模板文件"""
+        with self._lock:
+            keep = [i for i, uid in enumerate(self.user_ids) if uid != user_id]
+            if len(keep) == self.count:
+                return
+            self._keep_rows(keep)
+            self._save()
+
+    def sync(self, users):
+        """
+        与用户数据对齐：删除已不存在的图片特征，并为缺失特征的图片补建(仅首次迁移时读取图片)
+        参数：
+            users: UserDataManager.users
+        """
+        with self._lock:
+            expected = {}
+            for user_id, user_data in users.items():
+                for image_path in user_data['images']:
+                    expected[image_path] = user_id
+            keep = [i for i, path in enumerate(self.paths) if expected.get(path) == self.user_ids[i]]
+            removed = len(keep) != self.count
+            if removed:
+                self._keep_rows(keep)
+            start = self.count
+            known = set(self.paths)
+            for image_path, user_id in expected.items():
+                if image_path not in known and os.path.exists(image_path):
+                    image = load_palm_image(image_path)
+                    if image is not None:
+                        try:
+                            self._append(user_id, image_path, extract_features(image))
+                        except ValueError as e:
+                            print(f"补建特征失败: {e}")
+            if removed:
+                self._save()
+            elif self.count > start:
+                self._append_file(start)
+
+    def match(self, probe, top_k=None, pool=None):
+        """
+        1:N 批量匹配
+        参数：
+            probe: 待识别图像的特征向量
+            top_k: 只返回得分最高的前k个用户(None表示全部)
+            pool: GalleryMatchPool，特征行数较多时分片到多个进程并行比对
+        返回：
+            list: [(身份证号, 平均相似度), ...] 按得分从高到低排序
+        """
+        with self._lock:
+            if self.count == 0:
+                return []
+            label_count = len(self._label_ids)
+            result = None
+            if pool is not None and self.count >= PARALLEL_MATCH_MIN_ROWS:
+                result = pool.match(self._shared, self.count, probe, label_count)
+            if result is None:
+                scores = batch_compare(probe, self.features)
+                labels = self._labels[:self.count]
+                result = (np.bincount(labels, weights=scores, minlength=label_count),
+                          np.bincount(labels, minlength=label_count))
+            sums, counts = result
+            label_ids = list(self._label_ids)
+        present = np.flatnonzero(counts)
+        means = sums[present] / counts[present]
+        order = np.argsort(-means, kind='stable')
+        if top_k is not None:
+            order = order[:top_k]
+        return [(label_ids[present[i]], float(means[i])) for i in order]
+
+    def close(self):
+        """释放共享内存"""
+        with self._lock:
+            self._buffer = self._labels = None
+            self._shared.close()
 
 
 
@@ -69,6 +1133,10 @@ class MainScreen(Screen):
             self.recognition_pending = False
             Clock.schedule_once(lambda dt: self.camera_layout._perform_recognition(), 0.1)
 
+    def on_leave(self):
+        """离开主屏幕时取消尚未完成的识别"""
+        self.camera_layout.cancel_recognition()
+
     def switch_to_settings(self, instance):
         self.manager.current = 'settings'
 
@@ -77,10 +1145,11 @@ class SettingsScreen(Screen):
     """
     设置屏幕 - 只显示操作按钮
     """
-    def __init__(self, **kwargs):
+    def __init__(self, user_manager=None, **kwargs):
         super(SettingsScreen, self).__init__(**kwargs)
         
-        self.user_manager = UserDataManager()
+        # 与主屏幕共用同一个用户数据管理器，保证特征库一致
+        self.user_manager = user_manager or UserDataManager()
         # 背景颜色
         with self.canvas.before:
             Color(0.2, 0.2, 0.2, 1)  # 深灰色背景
@@ -92,14 +1161,14 @@ class SettingsScreen(Screen):
         main_layout = FloatLayout()  # 改为FloatLayout以便精确控制位置
         
         # 标题
-        title_label = Label(
+        self.title_label = Label(
             text="掌纹识别系统",
             font_size=28,
             color=(1, 1, 1, 1),
             size_hint=(0.8, 0.4),
             pos_hint={'center_x': 0.5, 'top': 0.9}
         )
-        main_layout.add_widget(title_label)
+        main_layout.add_widget(self.title_label)
         
         # 按钮布局
         button_layout = BoxLayout(
@@ -156,7 +1225,12 @@ class SettingsScreen(Screen):
         self.add_widget(main_layout)
     
     def show_user_management(self, instance):
-        """显示用户管理弹窗"""
+        """显示用户管理弹窗(用户数据仍在后台加载时只提示，不阻塞界面)"""
+        if not self.user_manager.ready.is_set() or self.user_manager.load_error is not None:
+            loading = self.user_manager.load_error is None
+            self.title_label.text = "用户数据加载中，请稍候" if loading else "用户数据加载失败"
+            Clock.schedule_once(lambda dt: setattr(self.title_label, 'text', "掌纹识别系统"), 2)
+            return
         popup = UserManagementPopup(user_manager=self.user_manager)
         popup.open()
 
@@ -177,15 +1251,24 @@ class SettingsScreen(Screen):
         Clock.schedule_once(lambda dt: main_screen.camera_layout.show_capture_popup(), 0.1)
 
 
-class UserDataManager:
-    """用户数据管理器，负责保存和加载用户信息"""
-    def __init__(self):
-        self.data_file = "user_data.json"
-        self.users = OrderedDict()  # 保持插入顺序
-        self._load_data()
-
-    def _load_data(self):
-        """加载用户数据"""
+class JsonJournalBackend:
+    """
+    JSON存储后端(默认)
+    user_data.json为快照，之后的每次修改以一行JSON追加到user_data.journal，
+    启动时先读快照再重放日志，日志累计到一定条数后合并成新快照
+    属性：
+        users: 内存中的用户数据 OrderedDict(身份证号 -> {'name', 'id', 'images'})，
+               在load和每次修改时维护，UserDataManager直接读取
+    """
+    def __init__(self, data_file="user_data.json", journal_file="user_data.journal"):
+        self.users = OrderedDict()
+        self.data_file = data_file
+        self.journal_file = journal_file
+        self._journal_count = 0  # 日志中尚未合并的记录数
+
+    def load(self):
+        """加载用户数据：读取快照后按顺序重放日志"""
+        self.users = OrderedDict()
         if os.path.exists(self.data_file):
             try:
                 with open(self.data_file, 'r', encoding='utf-8') as f:
@@ -193,72 +1276,427 @@ class UserDataManager:
             except Exception as e:
                 print(f"加载用户数据失败: {e}")
                 self.users = OrderedDict()
+        if os.path.exists(self.journal_file):
+            damaged = False  # 有写入中断留下的不完整行时必须重写日志，否则之后追加的记录会接在残行后面
+            try:
+                with open(self.journal_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        if not line.endswith("\n"):
+                            damaged = True
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # 写入中断留下的不完整行，忽略
+                            damaged = True
+                            continue
+                        self._apply_record(record)
+                        self._journal_count += 1
+            except Exception as e:
+                print(f"读取用户数据日志失败: {e}")
+                damaged = True
+            if self._journal_count or damaged:
+                self._compact()
+        return self.users
+
+    def _apply_record(self, record):
+        """把一条修改记录应用到内存数据(重放日志时可重复执行)"""
+        op = record.get('op')
+        if op == 'add_user':
+            self.users[record['id']] = {
+                'name': record['name'],
+                'id': record['id'],
+                'images': []
+            }
+        elif op == 'add_image':
+            user_data = self.users.get(record['id'])
+            if user_data is not None and record['path'] not in user_data['images']:
+                user_data['images'].append(record['path'])
+        elif op == 'delete_user':
+            self.users.pop(record['id'], None)
+
+    def _append_journal(self, record):
+        """追加一条修改记录，累计到一定条数后合并快照"""
+        try:
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_count += 1
+        except Exception as e:
+            print(f"写入用户数据日志失败: {e}")
+        if self._journal_count >= JOURNAL_COMPACT_EVERY:
+            self._compact()
 
     def _save_data(self):
-        """保存用户数据"""
+        """保存用户数据快照(先写临时文件再替换，写入中断不会损坏原快照)"""
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
+            temp_file = self.data_file + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
                 json.dump(self.users, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.data_file)
+            return True
         except Exception as e:
             print(f"保存用户数据失败: {e}")
+            return False
+
+    def _compact(self):
+        """把日志合并进快照并清空日志"""
+        if self._save_data():
+            try:
+                open(self.journal_file, 'w', encoding='utf-8').close()
+                self._journal_count = 0
+            except Exception as e:
+                print(f"清空用户数据日志失败: {e}")
+
+    def _commit(self, record):
+        """应用并记录一次修改"""
+        self._apply_record(record)
+        self._append_journal(record)
+
+    def add_user(self, name, id_number, replace=False):
+        """添加用户；replace为True时先删除同ID的旧记录"""
+        if replace:
+            self._commit({'op': 'delete_user', 'id': id_number})
+        self._commit({'op': 'add_user', 'id': id_number, 'name': name})
+
+    def add_image(self, id_number, image_path):
+        """添加用户图片记录"""
+        self._commit({'op': 'add_image', 'id': id_number, 'path': image_path})
+
+    def delete_user(self, id_number):
+        """删除用户记录"""
+        self._commit({'op': 'delete_user', 'id': id_number})
+
+    def close(self):
+        """快照和日志在每次修改时已写入，没有需要释放的资源"""
+        pass
+
+
+class SqliteBackend:
+    """
+    SQLite存储后端 - 用户表和图片表分别建索引，每次修改在一个事务内完成
+    数据库为空且存在user_data.json时，首次启动会自动导入原有JSON数据
+    """
+    # 固定的SQL语句，sqlite3模块会缓存其编译结果(预编译语句)
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS users ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " id TEXT NOT NULL UNIQUE,"
+        " name TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS images ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,"
+        " path TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_users_name ON users(name)",
+        "CREATE INDEX IF NOT EXISTS idx_images_user ON images(user_id)",
+    )
+    _SQL_SELECT_USERS = "SELECT id, name FROM users ORDER BY seq"
+    _SQL_SELECT_IMAGES = "SELECT user_id, path FROM images ORDER BY seq"
+    _SQL_COUNT_USERS = "SELECT COUNT(*) FROM users"
+    _SQL_INSERT_USER = "INSERT INTO users (id, name) VALUES (?, ?)"
+    _SQL_INSERT_IMAGE = "INSERT INTO images (user_id, path) VALUES (?, ?)"
+    _SQL_DELETE_USER = "DELETE FROM users WHERE id = ?"
+
+    def __init__(self, db_file=USER_DB_FILE, migrate_from=None):
+        self.users = OrderedDict()
+        self.db_file = db_file
+        self.migrate_from = migrate_from  # 迁移来源(JsonJournalBackend)
+        # 后台写入线程也会访问，由UserDataManager.lock保证串行
+        self.conn = sqlite3.connect(db_file, check_same_thread=False, cached_statements=32)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        with self.conn:
+            for sql in self._SCHEMA:
+                self.conn.execute(sql)
+
+    def load(self):
+        """加载用户数据(数据库为空时先从JSON迁移)"""
+        if self.migrate_from is not None:
+            self._migrate()
+        self.users = OrderedDict()
+        for id_number, name in self.conn.execute(self._SQL_SELECT_USERS):
+            self.users[id_number] = {'name': name, 'id': id_number, 'images': []}
+        for id_number, image_path in self.conn.execute(self._SQL_SELECT_IMAGES):
+            if id_number in self.users:
+                self.users[id_number]['images'].append(image_path)
+        return self.users
+
+    def _migrate(self):
+        """把原JSON存储中的数据一次性导入(原文件保留不动)"""
+        if self.conn.execute(self._SQL_COUNT_USERS).fetchone()[0]:
+            return
+        source = self.migrate_from
+        if not (os.path.exists(source.data_file) or os.path.exists(source.journal_file)):
+            return
+        users = source.load()
+        try:
+            with self.conn:
+                self.conn.executemany(self._SQL_INSERT_USER,
+                                      [(uid, u['name']) for uid, u in users.items()])
+                self.conn.executemany(self._SQL_INSERT_IMAGE,
+                                      [(uid, path) for uid, u in users.items() for path in u['images']])
+            print(f"已从{source.data_file}导入{len(users)}个用户")
+        except Exception as e:
+            print(f"导入用户数据失败: {e}")
+
+    def add_user(self, name, id_number, replace=False):
+        """添加用户；replace为True时在同一事务内先删除同ID的旧记录"""
+        with self.conn:
+            if replace:
+                self.conn.execute(self._SQL_DELETE_USER, (id_number,))
+            self.conn.execute(self._SQL_INSERT_USER, (id_number, name))
+        if replace:
+            self.users.pop(id_number, None)
+        self.users[id_number] = {'name': name, 'id': id_number, 'images': []}
+
+    def add_image(self, id_number, image_path):
+        """添加用户图片记录"""
+        with self.conn:
+            self.conn.execute(self._SQL_INSERT_IMAGE, (id_number, image_path))
+        self.users[id_number]['images'].append(image_path)
+
+    def delete_user(self, id_number):
+        """删除用户记录"""
+        with self.conn:
+            self.conn.execute(self._SQL_DELETE_USER, (id_number,))  # 图片记录级联删除
+        self.users.pop(id_number, None)
+
+    def close(self):
+        """关闭数据库连接"""
+        self.conn.close()
+
+
+class UserSearchIndex:
+    """
+    用户搜索索引 - 随增删增量维护，搜索时不再逐个扫描所有用户
+    姓名和身份证号的3字片段建立倒排表：
+        查询长度>=3: 取各3字片段倒排表的交集，再逐个确认是否包含查询串
+        查询长度<3: 片段太短无法用倒排表，逐个检查姓名和身份证号是否包含查询串
+    结果列表会缓存到下一次增删，翻页时直接切片
+    """
+    def __init__(self):
+        self._seq = {}  # 身份证号 -> 插入序号(结果按注册顺序排列)
+        self._next_seq = 0
+        self._keys = {}  # 身份证号 -> (小写姓名, 小写身份证号)，按注册顺序
+        self._grams = {}  # 片段 -> 身份证号集合
+        self._cache = (None, [])  # 最近一次查询的(查询串, 结果)，翻页时复用
+
+    @staticmethod
+    def _user_grams(name, id_number):
+        grams = set()
+        for key in (name, id_number):
+            grams.update(key[i:i + 3] for i in range(len(key) - 2))
+        return grams
+
+    def add(self, id_number, name):
+        """加入一个用户(已存在时先移除旧记录)"""
+        if id_number in self._keys:
+            self.remove(id_number)
+        keys = (name.lower(), id_number.lower())
+        self._keys[id_number] = keys
+        self._seq[id_number] = self._next_seq
+        self._next_seq += 1
+        for gram in self._user_grams(*keys):
+            self._grams.setdefault(gram, set()).add(id_number)
+        self._cache = (None, [])
+
+    def remove(self, id_number):
+        """移除一个用户"""
+        keys = self._keys.pop(id_number, None)
+        if keys is None:
+            return
+        del self._seq[id_number]
+        for gram in self._user_grams(*keys):
+            postings = self._grams.get(gram)
+            if postings is not None:
+                postings.discard(id_number)
+                if not postings:
+                    del self._grams[gram]
+        self._cache = (None, [])
+
+    def search(self, query):
+        """
+        搜索姓名或身份证号包含query的用户
+        返回：
+            list: 身份证号列表，按注册顺序排列
+        """
+        query = query.lower()
+        if self._cache[0] == query:
+            return self._cache[1]
+        if len(query) >= 3:
+            postings = [self._grams.get(query[i:i + 3], set()) for i in range(len(query) - 2)]
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            if len(query) > 3:
+                candidates = {uid for uid in candidates
+                              if query in self._keys[uid][0] or query in self._keys[uid][1]}
+            result = sorted(candidates, key=self._seq.__getitem__)
+        else:
+            # _keys按注册顺序排列，扫描结果无需再排序；空查询即全部用户
+            result = [uid for uid, (name, id_number) in self._keys.items()
+                      if query in name or query in id_number]
+        self._cache = (query, result)
+        return result
+
+
+def create_user_store(kind=None):
+    """
+    按配置创建用户数据存储后端
+    后端都提供相同的方法：load()、add_user(name, id_number, replace)、add_image(id_number, image_path)、
+    delete_user(id_number)、close()，以及UserDataManager直接读取的users属性
+    """
+    kind = kind or USER_STORE_BACKEND
+    if kind == "sqlite":
+        return SqliteBackend(migrate_from=JsonJournalBackend())
+    return JsonJournalBackend()
+
+
+class UserDataManager:
+    """
+    用户数据管理器，负责保存和加载用户信息
+    实际的持久化由存储后端完成(见create_user_store)，这里负责加锁、删除图片文件和维护特征库
+    background为True时在后台线程中加载，加载完成前调用的方法会等待ready
+    加载失败时load_error保存异常，之后访问用户数据或特征库会抛出RuntimeError
+    """
+    def __init__(self, backend=None, background=False):
+        self.backend = backend
+        self._gallery = None
+        self.lock = threading.RLock()  # 后台写入线程与界面线程共用数据时加锁
+        self.search_index = UserSearchIndex()
+        self.ready = threading.Event()  # 用户数据和特征库加载完成(或失败)后置位
+        self.load_error = None  # 后台加载失败时的异常
+        if background:
+            threading.Thread(target=self._load_all, daemon=True).start()
+        else:
+            self._load_all()
+
+    def wait_ready(self):
+        """等待加载完成；加载失败时抛出RuntimeError(原异常作为__cause__)"""
+        self.ready.wait()
+        if self.load_error is not None:
+            raise RuntimeError(f"用户数据加载失败: {self.load_error}") from self.load_error
+
+    @property
+    def users(self):
+        """内存中的用户数据(保持插入顺序)"""
+        self.wait_ready()
+        return self.backend.users
+
+    @property
+    def gallery(self):
+        """特征库"""
+        self.wait_ready()
+        return self._gallery
+
+    def _load_all(self):
+        """创建存储后端，加载用户数据和特征库"""
+        try:
+            if self.backend is None:
+                self.backend = create_user_store()
+            self._load_data()
+            # 特征库：注册时增量更新，识别时不再读取图片文件
+            self._gallery = FeatureGallery()
+            self._gallery.sync(self.backend.users)
+        except Exception as e:
+            print(f"加载用户数据失败: {e}")
+            self.load_error = e
+        finally:
+            self.ready.set()
+
+    def _load_data(self):
+        """加载用户数据"""
+        try:
+            self.backend.load()
+        except Exception as e:
+            print(f"加载用户数据失败: {e}")
+        for id_number, user_data in self.backend.users.items():
+            self.search_index.add(id_number, user_data['name'])
 
     def add_user(self, name, id_number, force=False):
         """添加新用户
-        force: 如果为True，当用户已存在时会先删除旧记录
+        force: 如果为True，当用户已存在时会先删除旧记录(与新增在同一事务内完成)
         """
-        if id_number in self.users:
-            if force:
-                # 强制模式：先删除旧用户
-                self.delete_user(id_number)
+        with self.lock:
+            if id_number in self.users:
+                if not force:
+                    return False
+                # 强制模式：删除旧用户的图片文件和特征
+                self._remove_user_files(id_number)
+                self.backend.add_user(name, id_number, replace=True)
+                self.gallery.remove_user(id_number)
             else:
+                self.backend.add_user(name, id_number)
+            self.search_index.add(id_number, name)
+            return True
+
+    def add_image(self, id_number, image_path, image=None, feature=None):
+        """添加用户图片记录(可在后台写入线程中调用)
+        image: 刚采集的图像，传入时直接提取特征，避免重新读取文件
+        feature: 已提取好的特征，传入时不再重复提取
+        """
+        with self.lock:
+            if id_number not in self.users:
                 return False
-        # 添加新用户
-        self.users[id_number] = {
-            'name': name,
-            'id': id_number,
-            'images': []
-        }
-        self._save_data()
+            self.backend.add_image(id_number, image_path)
+        self.gallery.add(id_number, image_path, image, feature)
         return True
 
-    def add_image(self, id_number, image_path):
-        """添加用户图片记录"""
-        if id_number in self.users:
-            self.users[id_number]['images'].append(image_path)
-            self._save_data()
-            return True
-        return False
+    def _remove_user_files(self, id_number):
+        """删除用户的所有图片文件"""
+        for img_path in self.users[id_number]['images']:
+            if os.path.exists(img_path):
+                os.remove(img_path)
 
     def delete_user(self, id_number):
         """删除用户及其所有图片"""
-        if id_number in self.users:
-            # 删除图片文件
-            for img_path in self.users[id_number]['images']:
-                if os.path.exists(img_path):
-                    os.remove(img_path)
-            # 从用户数据中删除
-            del self.users[id_number]
-            self._save_data()
-            return True
-        return False
+        with self.lock:
+            if id_number in self.users:
+                # 删除图片文件
+                self._remove_user_files(id_number)
+                # 从用户数据中删除
+                self.backend.delete_user(id_number)
+                self.search_index.remove(id_number)
+                self.gallery.remove_user(id_number)
+                return True
+            return False
+
+    def close(self):
+        """关闭存储后端并释放特征库(加载失败时只释放已创建的部分)"""
+        self.ready.wait()
+        with self.lock:
+            if self._gallery is not None:
+                self._gallery.close()
+            if self.backend is not None:
+                self.backend.close()
 
     def get_user_images(self, id_number):
         """获取指定用户的所有图片"""
-        return self.users.get(id_number, {}).get('images', [])
-
-    def search_users(self, query):
-        """搜索用户"""
-        results = []
-        query = query.lower()
-        for user_id, user_data in self.users.items():
-            if (query in user_data['name'].lower() or 
-                query in user_id.lower()):
-                results.append(user_data.copy())  # 返回副本
-        return results
+        with self.lock:
+            return list(self.users.get(id_number, {}).get('images', []))
+
+    def count_search_results(self, query):
+        """搜索结果总数(query为空时为全部用户数)"""
+        self.wait_ready()
+        with self.lock:
+            if not query:
+                return len(self.users)
+            return len(self.search_index.search(query))
+
+    def search_users(self, query, offset=0, limit=None):
+        """搜索用户(姓名或身份证号包含query)
+        offset, limit: 分页参数，只复制当前页的用户数据
+        """
+        self.wait_ready()
+        with self.lock:
+            user_ids = self.search_index.search(query)
+            end = None if limit is None else offset + limit
+            return [self.users[uid].copy() for uid in user_ids[offset:end]]  # 返回副本
 
-    def get_all_users(self):
-        """获取所有用户"""
-        return list(self.users.values())
+    def get_all_users(self, offset=0, limit=None):
+        """获取所有用户(可分页；全部用户的列表由搜索索引缓存，翻页时直接切片)"""
+        return self.search_users("", offset, limit)
 
 
 class CapturePopup(Popup):
@@ -388,14 +1826,59 @@ class RecognitionPopup(FloatLayout):
 
 
 
+class UserResultRow(BoxLayout):
+    """
+    用户结果行 - 由RecycleView复用，只为屏幕上可见的行创建控件
+    属性：
+        text: 显示的用户信息(或提示文字)
+        user: 对应的用户数据，为None时表示提示行(不显示删除按钮)
+        delete_callback: 点击删除按钮时的回调，参数为user
+    """
+    text = StringProperty("")
+    user = ObjectProperty(None, allownone=True)
+    delete_callback = ObjectProperty(None, allownone=True)
+
+    def __init__(self, **kwargs):
+        super(UserResultRow, self).__init__(**kwargs)
+        self.spacing = 10
+
+        # 用户信息
+        self.info_label = Label(size_hint_x=0.7, halign="left", valign="middle")
+        self.info_label.bind(size=self.info_label.setter('text_size'))
+        self.add_widget(self.info_label)
+
+        # 删除按钮
+        self.delete_btn = Button(
+            text="删除",
+            size_hint_x=0.15,
+            size_hint_y=0.5,
+            pos_hint={'center_y': 0.5},
+            background_color=(0.8, 0.2, 0.2, 1)
+        )
+        self.delete_btn.bind(on_press=self._on_delete_press)
+        self.add_widget(self.delete_btn)
+
+        self.bind(text=self.info_label.setter('text'), user=self._update_delete_button)
+        # user默认为None，再次设为None不会触发事件，这里先按初始值设置一次
+        self._update_delete_button(self, self.user)
+
+    def _on_delete_press(self, instance):
+        if self.delete_callback is not None and self.user is not None:
+            self.delete_callback(self.user)
+
+    def _update_delete_button(self, instance, user):
+        """提示行隐藏删除按钮"""
+        self.delete_btn.opacity = 1 if user is not None else 0
+        self.delete_btn.disabled = user is None
+
+
 class UserManagementPopup(Popup):
     """
     用户管理弹窗 - 用于查询和删除用户
     属性：
         search_input: 搜索输入框(姓名或ID)
         search_button: 搜索按钮
-        results_layout: 结果显示区域
-        delete_buttons: 删除按钮列表
+        results_view: 结果列表(RecycleView，滚动到底部时加载下一页)
     """
     def __init__(self, user_manager, **kwargs):
         super(UserManagementPopup, self).__init__(**kwargs)
@@ -415,12 +1898,25 @@ class UserManagementPopup(Popup):
         search_layout.add_widget(search_button)
         main_layout.add_widget(search_layout)
         
-        # 结果区域(带滚动条)
-        scroll_view = ScrollView()
-        self.results_layout = GridLayout(cols=1, spacing=10, size_hint_y=None)
-        self.results_layout.bind(minimum_height=self.results_layout.setter('height'))
-        scroll_view.add_widget(self.results_layout)
-        main_layout.add_widget(scroll_view)
+        # 结果区域(带滚动条，只创建可见行)
+        self.results_view = RecycleView(viewclass=UserResultRow)
+        results_layout = RecycleBoxLayout(
+            orientation='vertical',
+            spacing=10,
+            default_size=(None, 60),
+            default_size_hint=(1, None),
+            size_hint_y=None
+        )
+        results_layout.bind(minimum_height=results_layout.setter('height'))
+        self.results_view.add_widget(results_layout)
+        self.results_view.bind(scroll_y=self._on_results_scroll)
+        main_layout.add_widget(self.results_view)
+        
+        # 分页状态
+        self._query = ""
+        self._loaded = 0
+        self._total = 0
+        self._has_more = False
         
         # 关闭按钮
         close_button = Button(text="关闭", size_hint_y=0.1)
@@ -435,53 +1931,43 @@ class UserManagementPopup(Popup):
         self.search_users(None)
 
     def search_users(self, instance):
-        """根据输入搜索用户"""
-        query = self.search_input.text.strip()
-        self.results_layout.clear_widgets()
-        
-        if query:
-            users = self.user_manager.search_users(query)
-        else:
-            users = self.user_manager.get_all_users()
+        """根据输入搜索用户(只加载第一页)"""
+        self._query = self.search_input.text.strip()
+        self._loaded = 0
+        self._total = self.user_manager.count_search_results(self._query)
+        self._has_more = self._total > 0
+        self.title = f"用户管理 (共{self._total}个用户)"
+        self.results_view.data = []
+        self.results_view.scroll_y = 1
+        self._load_next_page()
         
-        if not users:
-            self._add_result_label("没有找到匹配的用户")
-        else:
-            for user in users:
-                self._add_user_result(user)
+        if not self.results_view.data:
+            self.results_view.data = [{'text': "没有找到匹配的用户", 'user': None, 'delete_callback': None}]
 
-    def _add_result_label(self, text):
-        """添加结果标签"""
-        label = Label(text=text, size_hint_y=None, height=40)
-        self.results_layout.add_widget(label)
-    
-    def _add_user_result(self, user):
-        """添加单个用户结果"""
-        user_layout = BoxLayout(size_hint_y=None, height=60, spacing=10)
-        
-        # 用户信息
-        info_label = Label(
-            text=f"姓名: {user['name']}  身份证: {user['id']}  照片数: {len(user['images'])}",
-            size_hint_x=0.7,
-            halign="left",
-            valign="middle"
-        )
-        info_label.bind(size=info_label.setter('text_size'))
-        user_layout.add_widget(info_label)
-        
-        # 删除按钮
-        delete_btn = Button(
-            text="删除",
-            size_hint_x=0.15,
-            size_hint_y=0.5,
-            pos_hint={'center_y': 0.5},
-            background_color=(0.8, 0.2, 0.2, 1)
-        )
-        delete_btn.bind(
-            on_press=lambda x, u=user: self._confirm_delete_user(u))
-        user_layout.add_widget(delete_btn)
-        
-        self.results_layout.add_widget(user_layout)
+    def _load_next_page(self):
+        """加载下一页结果并追加到列表"""
+        if not self._has_more:
+            return
+        if self._query:
+            users = self.user_manager.search_users(self._query, offset=self._loaded, limit=USER_PAGE_SIZE)
+        else:
+            users = self.user_manager.get_all_users(offset=self._loaded, limit=USER_PAGE_SIZE)
+        self._loaded += len(users)
+        self._has_more = bool(users) and self._loaded < self._total
+        self.results_view.data.extend(self._user_row_data(user) for user in users)
+
+    def _on_results_scroll(self, instance, scroll_y):
+        """滚动接近底部时加载下一页"""
+        if scroll_y <= 0.05 and self._has_more:
+            self._load_next_page()
+
+    def _user_row_data(self, user):
+        """单个用户结果行的数据"""
+        return {
+            'text': f"姓名: {user['name']}  身份证: {user['id']}  照片数: {len(user['images'])}",
+            'user': user,
+            'delete_callback': self._confirm_delete_user
+        }
 
     def _confirm_delete_user(self, user):
         """显示确认删除弹窗"""
@@ -557,7 +2043,7 @@ class CameraLayout(FloatLayout):
         is_capturing: 采集状态标志
         hand: 当前采集的手(左/右)
         capture_count: 已采集图像计数
-        engine: 语音引擎
+        speech: 语音播报服务
     """
     def __init__(self, **kwargs):
         super(CameraLayout, self).__init__(**kwargs)
@@ -611,9 +2097,29 @@ class CameraLayout(FloatLayout):
         )
         self.add_widget(self.hint_label)
         
-        # 初始化摄像头
-        self.capture = cv2.VideoCapture(0)
-        Clock.schedule_interval(self.update_frame, 1.0 / 30.0)  # 30fps更新
+        # 画面处理缓冲区(按分辨率预先分配，每帧复用；只处理取景框外接正方形内的像素)
+        self._frame_size = None
+        self._roi_bounds = None
+        self._mask = None
+        self._masked_frame = None
+        self._masked_pixels = None
+        self._texture = None
+
+        # 初始化摄像头(在后台线程中打开和读取，界面线程只取最新帧)
+        self.grabber = FrameGrabber(0, buffer_size=BURST_SIZE)
+        self.grabber.start()
+        self.displayed_frame = None  # 当前显示在屏幕上的帧(已裁剪到取景框)
+        self._displayed_frame_id = 0
+        # 自适应刷新：取景框内有运动时30fps，长时间静止后降频
+        self.motion = MotionDetector()
+        # 采集质量检查，手掌合格时自动采集
+        self.quality_gate = FrameQualityGate()
+        self._next_auto_capture = 0
+        self._hand_features = []  # 当前这只手已采集图像的特征，用于剔除重复画面
+        self._probe_count = 0  # 已保存的识别画面数，用于区分同一毫秒内的文件名
+        self._last_activity = time.time()
+        self._frame_rate = PREVIEW_FPS
+        self._frame_event = Clock.schedule_interval(self.update_frame, 1.0 / PREVIEW_FPS)
         
         # 采集状态
         self.is_capturing = False
@@ -629,11 +2135,73 @@ class CameraLayout(FloatLayout):
             self.progress_circle = Line(circle=(0, 0, 0), width=2)
 
         # 初始化语音引擎
-        self.engine = pyttsx3.init()
-        self.engine.setProperty("rate", 150)  # 语速设置
+        self.speech = SpeechService()
 
-        # 添加用户数据管理器
-        self.user_manager = UserDataManager()
+        # 添加用户数据管理器(后台加载)
+        self.user_manager = UserDataManager(background=True)
+
+        # 后台图片写入器
+        self.image_writer = AsyncImageWriter()
+
+        # 识别在后台线程中执行，界面线程只负责取帧和显示结果
+        self.recognizer = ThreadPoolExecutor(max_workers=1)
+        self._recognition_future = None
+        self._recognition_token = 0  # 每次识别/取消时递增，过期的结果直接丢弃
+
+        # 启动状态提示，后台初始化全部完成后隐藏
+        self._startup_event = Clock.schedule_interval(self._update_startup_status, 0.2)
+
+    def wake(self):
+        """有用户操作时立即恢复全速刷新"""
+        self._last_activity = time.time()
+        self._adjust_frame_rate()
+
+    def _adjust_frame_rate(self):
+        """按最近一次活动时间切换全速/空闲刷新频率"""
+        idle = time.time() - self._last_activity > IDLE_TIMEOUT
+        frame_rate = IDLE_FPS if idle else PREVIEW_FPS
+        if frame_rate == self._frame_rate:
+            return
+        self._frame_rate = frame_rate
+        self._frame_event.cancel()
+        self._frame_event = Clock.schedule_interval(self.update_frame, 1.0 / frame_rate)
+        # 空闲时采集线程也只按同样的频率解码
+        self.grabber.min_interval = 1.0 / frame_rate if idle else 0
+
+    def _check_user_data_ready(self):
+        """用户数据已加载完成时返回True；仍在后台加载时提示稍候，避免界面线程等待；加载失败时提示失败"""
+        if self.user_manager.ready.is_set():
+            if self.user_manager.load_error is None:
+                return True
+            self.hint_label.text = "用户数据加载失败，无法注册或识别"
+        else:
+            self.hint_label.text = "用户数据加载中，请稍候"
+        self.hint_label.opacity = 1
+        Clock.schedule_once(lambda dt: setattr(self.hint_label, 'opacity', 0), 2)
+        return False
+
+    def _update_startup_status(self, dt):
+        """显示后台初始化进度"""
+        waiting = []
+        if not self.grabber.ready.is_set():
+            waiting.append("摄像头")
+        if not self.user_manager.ready.is_set():
+            waiting.append("用户数据")
+        if not self.speech.ready.is_set():
+            waiting.append("语音")
+        if waiting:
+            self.hint_label.text = f"正在启动: {'、'.join(waiting)}..."
+            self.hint_label.opacity = 1
+            return
+        self._startup_event.cancel()
+        if not self.grabber.opened:
+            self.hint_label.text = "摄像头打开失败!"
+            return
+        if self.user_manager.load_error is not None:
+            self.hint_label.text = "用户数据加载失败!"
+            return
+        self.hint_label.text = "请将手掌放置白色圆圈内！"
+        self.hint_label.opacity = 0
 
     def handle_capture(self):
         """处理采集按钮点击"""
@@ -676,84 +2244,131 @@ class CameraLayout(FloatLayout):
         self.popup.open()
 
     def _confirm_cancel(self, instance):
-        """确认取消采集后重置空闲状态"""
+        """
+        确认取消采集后重置空闲状态
+        该用户的图片可能还在写入队列中：删除放在写入线程中、排在这些写入之后执行，界面线程不等待
+        """
         self.popup.dismiss()
-        # 删除临时图片
-        if os.path.exists("local_images"):
-            # 删除该用户的所有图片
-            for image_path in self.user_manager.get_user_images(self.id_number):
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-        
-        # 从用户数据中删除该用户
-        self.user_manager.delete_user(self.id_number)
+        self.is_capturing = False  # 先停止采集，之后不会再提交新的图片
+        self.image_writer.run_after_writes(
+            lambda id_number=self.id_number: self.user_manager.delete_user(id_number),  # 同时删除图片文件
+            callback=self._on_cancel_finished)
         
-        self.is_capturing = False
+        self.grabber.set_mode("preview")
         self.hand = "left"
         self.capture_count = 0
         self.total_captured = 0
         self.progress = 0
         
-        self.hint_label.text = "取消采集成功"
+        self.hint_label.text = "正在取消采集..."
         self.hint_label.opacity = 1
-        self.settings_button.opacity = 1
-        self.settings_button.disabled = False
         self.capture_btn.opacity = 0
         self.cancel_btn.opacity = 0
         
         if self.progress_circle is not None:
             self.canvas.remove(self.progress_circle)
             self.progress_circle = None
-        
+
+    def _on_cancel_finished(self):
+        """取消的用户已删除：恢复设置按钮(此前不能开始新的注册)"""
+        self.hint_label.text = "取消采集成功"
+        self.hint_label.opacity = 1
+        self.settings_button.opacity = 1
+        self.settings_button.disabled = False
         Clock.schedule_once(lambda dt: setattr(self.hint_label, 'opacity', 0), 2)
         
+    def current_frame(self):
+        """获取当前帧(取景框区域)：优先复用屏幕上正在显示的帧，没有时取采集线程的最新帧"""
+        if self.displayed_frame is not None:
+            return self.displayed_frame
+        latest = self.grabber.latest()
+        return crop_palm_roi(latest[2]) if latest is not None else None
+
     def _perform_recognition(self):
-        """实际执行识别逻辑"""
-        ret, frame = self.capture.read()
-        if ret:
-            # 保存临时图像用于比对
-            temp_filename = "temp_capture.png"
-            cv2.imwrite(temp_filename, frame)
-            current_image = cv2.imread(temp_filename, cv2.IMREAD_GRAYSCALE)
-            best_match = {"score": 0, "name": None}
-            
-            # 与存储的所有用户图像比对
-            if os.path.exists("local_images"):
-                for user_data in self.user_manager.get_all_users():
-                    user_score = 0
-                    image_count = 0
-                    
-                    # 比对该用户的所有图片
-                    for image_path in user_data['images']:
-                        if os.path.exists(image_path):
-                            local_image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-                            similarity = compare_images(current_image, local_image) # compare_images需要完善
-                            user_score += similarity
-                            image_count += 1
-                    
-                    # 计算平均相似度
-                    if image_count > 0:
-                        avg_score = user_score / image_count
-                        if avg_score > best_match["score"]:
-                            best_match["score"] = avg_score
-                            best_match["name"] = user_data['name']
-            
-            # 显示结果并播放语音
-            if best_match["score"] > 0.5:  # 相似度阈值
-                popup = RecognitionPopup(result=True, name=best_match["name"])
-                self.add_widget(popup)
-                Clock.schedule_once(lambda dt: self.play_audio(f"识别成功!"), 0.2)
-            else:
-                popup = RecognitionPopup(result=False)
-                self.add_widget(popup)
-                Clock.schedule_once(lambda dt: self.play_audio("识别失败!"), 0.2)
-            
-            # 重置提示标签
+        """取当前帧并提交到后台识别，界面线程不等待比对结果"""
+        if not self._check_user_data_ready():
+            return
+        self.wake()
+        frame = self.current_frame()
+        if frame is None:
+            return
+        if SAVE_RECOGNITION_PROBES:
+            # 文件名带毫秒和序号，同一秒内的多次识别不会互相覆盖
+            now = time.time()
+            self._probe_count += 1
+            audit_filename = os.path.join(
+                PROBE_AUDIT_DIR,
+                f"probe_{time.strftime('%Y%m%d_%H%M%S', time.localtime(now))}_{int(now * 1000) % 1000:03d}"
+                f"_{self._probe_count}.png")
+            self.image_writer.submit(audit_filename, frame)
+
+        self.cancel_recognition()
+        token = self._recognition_token
+        # 识别中提示
+        self.hint_label.text = "正在识别..."
+        self.hint_label.opacity = 1
+        self._recognition_future = self.recognizer.submit(self._recognize, frame)
+        self._recognition_future.add_done_callback(
+            lambda future: Clock.schedule_once(lambda dt: self._on_recognition_done(token, future)))
+
+    def _recognize(self, frame):
+        """在后台线程中执行：提取特征并与特征库比对，返回(相似度, 姓名)"""
+        # 直接在内存中转换为灰度图，不再写入/读取临时文件
+        current_image = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        best_match = {"score": 0, "name": None}
+
+        # 与特征库中所有模板一次性批量比对，按用户取平均相似度
+        # 比对只持有特征库自己的锁，不占用用户数据锁，界面和写入线程不必等待整个1:N搜索
+        probe = extract_features(current_image)
+        ranking = self.user_manager.gallery.match(probe, pool=_match_pool)
+        with self.user_manager.lock:
+            for user_id, avg_score in ranking:
+                if user_id in self.user_manager.users:
+                    best_match["score"] = avg_score
+                    best_match["name"] = self.user_manager.users[user_id]['name']
+                    break
+        return best_match["score"], best_match["name"]
+
+    def _on_recognition_done(self, token, future):
+        """在界面线程中显示识别结果并播放语音"""
+        if token != self._recognition_token or future.cancelled():
+            return  # 识别已被取消或被新的识别取代
+        self._recognition_future = None
+        try:
+            score, name = future.result()
+        except Exception as e:
+            print(f"识别失败: {e}")
+            score, name = 0, None
+
+        # 显示结果并播放语音
+        if score > 0.5:  # 相似度阈值
+            popup = RecognitionPopup(result=True, name=name)
+            self.add_widget(popup)
+            Clock.schedule_once(lambda dt: self.play_audio(f"识别成功!"), 0.2)
+        else:
+            popup = RecognitionPopup(result=False)
+            self.add_widget(popup)
+            Clock.schedule_once(lambda dt: self.play_audio("识别失败!"), 0.2)
+
+        # 重置提示标签
+        self.hint_label.text = "请将手掌放置白色圆圈内！"
+        Clock.schedule_once(lambda dt: setattr(self.hint_label, 'opacity', 0), 3)
+
+    def cancel_recognition(self):
+        """取消正在进行的识别，已在运行的比对结束后其结果会被丢弃"""
+        self._recognition_token += 1
+        if self._recognition_future is None:
+            return
+        self._recognition_future.cancel()
+        self._recognition_future = None
+        if self.hint_label.text == "正在识别...":
             self.hint_label.text = "请将手掌放置白色圆圈内！"
-            Clock.schedule_once(lambda dt: setattr(self.hint_label, 'opacity', 0), 3)
+            self.hint_label.opacity = 0
 
     def show_capture_popup(self):
         """显示注册弹窗"""
+        if not self._check_user_data_ready():
+            return
         # 先关闭任何已存在的弹窗
         if hasattr(self, 'popup') and self.popup:
             self.popup.dismiss()
@@ -764,6 +2379,8 @@ class CameraLayout(FloatLayout):
 
     def start_capture(self, name, id_number):
         """开始采集流程"""
+        if not self._check_user_data_ready():
+            return
         # 先添加用户到数据库
         if not self.user_manager.add_user(name, id_number):
             self.hint_label.text = "该ID已存在!"
@@ -773,6 +2390,10 @@ class CameraLayout(FloatLayout):
         self.name = name
         self.id_number = id_number
         self.is_capturing = True
+        self.grabber.set_mode("capture")  # 注册采集使用高分辨率模式
+        self.wake()
+        self._next_auto_capture = time.time() + AUTO_CAPTURE_INTERVAL
+        self._hand_features = []
         self.hand = "left"  # 从左手开始
         self.capture_count = 0
         self.progress = 0
@@ -789,21 +2410,34 @@ class CameraLayout(FloatLayout):
         return "左" if self.hand == "left" else "右"
 
     def capture_image(self, instance=None):
-        """采集并保存手掌图像"""
+        """
+        连拍采集：从最近几帧中选出最清晰的合格画面保存
+        画面都未通过质量检查、或与这只手已采集的图像重复时只提示原因，不保存
+        """
         if not self.is_capturing:
             return
-        ret, frame = self.capture.read()
-        if ret:
-            # 创建存储目录(如果不存在)
-            if not os.path.exists("local_images"):
-                os.makedirs("local_images")
-            
+        burst = [(frame_id, crop_palm_roi(frame)) for _, frame_id, frame in self.grabber.recent(BURST_SIZE)]
+        if burst:
+            frame, reason = self.quality_gate.select_best(burst)
+            if frame is None:
+                self.hint_label.text = f"{reason} ({self.get_hand_name()}手 {self.capture_count}/10)"
+                return
+            feature = extract_features(frame)
+            if self._hand_features and batch_compare(feature, np.array(self._hand_features)).max() > DUPLICATE_SIMILARITY:
+                self.hint_label.text = f"请稍微移动手掌 ({self.get_hand_name()}手 {self.capture_count}/10)"
+                return
+            self._hand_features.append(feature)
+            self._next_auto_capture = time.time() + AUTO_CAPTURE_INTERVAL
             # 使用ID作为文件名，避免中文问题
             filename = f"local_images/{self.id_number}_{self.hand}_{self.capture_count + 1}.png"
-            cv2.imwrite(filename, frame)
             
-            # 记录图片到用户数据
-            self.user_manager.add_image(self.id_number, filename)
+            # 写入图片、记录到用户数据(同时把特征写入特征库)都在后台线程中完成，界面不等待
+            # 查重时已提取的特征直接写入特征库；参数在此绑定，不受之后采集的影响
+            self.image_writer.submit(
+                filename, frame,
+                on_saved=lambda id_number=self.id_number, filename=filename, feature=feature:
+                    self.user_manager.add_image(id_number, filename, feature=feature),
+                callback=self._on_image_saved)
             
             self.capture_count += 1
             self.progress += 1
@@ -814,20 +2448,28 @@ class CameraLayout(FloatLayout):
                 if self.hand == "left":
                     self.hand = "right"
                     self.capture_count = 0
+                    self._next_auto_capture = time.time() + HAND_SWITCH_PAUSE  # 留出换手时间
+                    self._hand_features = []
                     self.hint_label.text = f"请将{self.get_hand_name()}手置于圆圈内 (0/10)"
                 else:
                     self.hint_label.text = "采集完成!"
                     self.is_capturing = False
+                    self.grabber.set_mode("preview")
                     self.settings_button.opacity = 1
                     self.settings_button.disabled = False
                     self.capture_btn.opacity = 0
                     self.cancel_btn.opacity = 0
                     Clock.schedule_once(self.reset_capture, 2)
 
+    def _on_image_saved(self, path, success):
+        """后台写入完成后的回调(界面线程)"""
+        if not success:
+            self.hint_label.text = "图片保存失败，请重新采集"
+            self.hint_label.opacity = 1
+
     def play_audio(self, text):
-        """播放语音反馈"""
-        self.engine.say(text)
-        self.engine.runAndWait()
+        """播放语音反馈(后台播报，不阻塞画面)"""
+        self.speech.say(text)
 
     def reset_capture(self, dt):
         """重置采集状态"""
@@ -840,30 +2482,58 @@ class CameraLayout(FloatLayout):
         self.settings_button.disabled = False
         self.cancel_btn.opacity = 0  # Ensure cancel button is hidden
 
+    def _prepare_frame_buffers(self, h, w):
+        """按分辨率预先计算圆形蒙版并分配输出缓冲区和纹理(分辨率变化时才重新创建)"""
+        if self._frame_size == (h, w):
+            return
+        self._frame_size = (h, w)
+        self._roi_bounds = palm_roi_bounds(h, w)
+        _, _, size, radius = self._roi_bounds
+        # 蒙版和输出缓冲区只覆盖取景框的外接正方形
+        self._mask = np.zeros((size, size), dtype=np.uint8)
+        cv2.circle(self._mask, (size // 2, size // 2), radius, 255, -1)  # -1表示填充
+        # bitwise_and只写入蒙版内的像素，圆外保持初始的黑色
+        self._masked_frame = np.zeros((size, size, 3), dtype=np.uint8)
+        # blit_buffer只接受一维缓冲区，预先取好展平的视图(与_masked_frame共享内存)
+        self._masked_pixels = self._masked_frame.reshape(-1)
+        # 纹理保持整帧大小(画面比例和位置不变)，创建时整体清成黑色，之后每帧只更新正方形区域
+        # 在纹理上垂直翻转，省去每帧的cv2.flip复制
+        self._texture = Texture.create(size=(w, h), colorfmt="bgr")
+        self._texture.flip_vertical()
+        self._texture.blit_buffer(np.zeros(h * w * 3, dtype=np.uint8), colorfmt="bgr", bufferfmt="ubyte")
+        self.camera_image.texture = self._texture
+
     def update_frame(self, dt):
         """更新摄像头画面，只显示圆圈内内容"""
-        ret, frame = self.capture.read()
-        if ret:
+        latest = self.grabber.latest()
+        if latest is not None and latest[1] != self._displayed_frame_id:
+            _, self._displayed_frame_id, frame = latest
             h, w = frame.shape[:2]
-            
-            # 创建一个黑色蒙版
-            mask = np.zeros((h, w), dtype=np.uint8)
-            # 在创建蒙版后添加高斯模糊
-            mask = cv2.GaussianBlur(mask, (15, 15), 0)
-            center = (w // 2, h // 2)
-            radius = min(w, h) // 3  # 半径为图像短边的1/3
-            # 在蒙版上绘制白色圆圈
-            cv2.circle(mask, center, radius, 255, -1)  # -1表示填充
-            # 应用蒙版：只保留圆圈内的图像
-            masked_frame = cv2.bitwise_and(frame, frame, mask=mask)
+            self._prepare_frame_buffers(h, w)
+            x0, y0, size, radius = self._roi_bounds
+            # 之后的识别、采集都只使用取景框区域(视图，不复制)
+            roi = frame[y0:y0 + size, x0:x0 + size]
+            self.displayed_frame = roi
+
+            # 取景框内有运动或正在采集时保持全速，否则一段时间后降频
+            if self.motion.update(roi) or self.is_capturing:
+                self._last_activity = time.time()
+            self._adjust_frame_rate()
+
+            # 注册时每一帧都做质量检查，第一张合格的画面即自动采集
+            if self.is_capturing and time.time() >= self._next_auto_capture:
+                self.capture_image()
+
+            # 应用蒙版：只保留圆圈内的图像(写入预分配缓冲区)
+            cv2.bitwise_and(roi, roi, dst=self._masked_frame, mask=self._mask)
             # 添加白色圆圈边框
-            cv2.circle(masked_frame, center, radius, (255, 255, 255), 2)
+            cv2.circle(self._masked_frame, (size // 2, size // 2), radius, (255, 255, 255), 2)
 
-            # 转换为纹理显示
-            buf = cv2.flip(masked_frame, 0).tobytes()
-            texture = Texture.create(size=(w, h), colorfmt="bgr")
-            texture.blit_buffer(buf, colorfmt="bgr", bufferfmt="ubyte")
-            self.camera_image.texture = texture
+            # 只上传取景框区域到纹理并通知界面重绘(局部更新要求缓冲区正好是size*size*3字节)
+            assert self._masked_pixels.nbytes == size * size * 3
+            self._texture.blit_buffer(self._masked_pixels, pos=(x0, y0), size=(size, size),
+                                      colorfmt="bgr", bufferfmt="ubyte")
+            self.camera_image.canvas.ask_update()
             
             # 更新进度条
             if self.is_capturing:
@@ -885,11 +2555,14 @@ class CameraLayout(FloatLayout):
 
 
     def on_stop(self):
-        """应用关闭时释放摄像头"""
-        # 获取主屏幕并释放摄像头
-        main_screen = self.root.get_screen('main')
-        if hasattr(main_screen.camera_layout, 'capture') and main_screen.camera_layout.capture.isOpened():
-            main_screen.camera_layout.capture.release()
+        """应用关闭时停止采集线程并释放摄像头"""
+        self.image_writer.flush()  # 确保采集的图片全部写入
+        self.cancel_recognition()
+        self.recognizer.shutdown(wait=True)
+        _match_pool.stop()
+        self.user_manager.close()
+        self.speech.stop()
+        self.grabber.stop()
 
 
 
@@ -912,13 +2585,19 @@ class MainApp(App):
         main_screen = MainScreen(name='main')
         sm.add_widget(main_screen)
         # 添加设置屏幕
-        settings_screen = SettingsScreen(name='settings')
+        settings_screen = SettingsScreen(name='settings', user_manager=main_screen.camera_layout.user_manager)
         # 将按钮回调绑定到主屏幕的摄像头布局
         settings_screen.capture_button.bind(on_press=lambda x: main_screen.camera_layout.handle_capture())
         settings_screen.recognize_button.bind(on_press=lambda x: main_screen.camera_layout.handle_recognize())
         sm.add_widget(settings_screen)
         return sm
 
+    def on_stop(self):
+        """应用关闭时释放摄像头"""
+        self.root.get_screen('main').camera_layout.on_stop()
+
 
 if __name__ == "__main__":
+    # 在界面启动前创建比对工作进程
+    _match_pool.start()
     MainApp().run()
\ No newline at end of file
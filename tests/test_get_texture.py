@@ -0,0 +1,85 @@
+"""
+预览纹理测试
+用真实的(h, w, 3)摄像头帧调用各版本的get_texture，确认帧能写入Kivy纹理
+(blit_buffer只接受bytes或一维缓冲区)
+没有显示器时使用SDL的offscreen驱动创建窗口
+"""
+import importlib.util
+import os
+import types
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+if not os.environ.get("DISPLAY"):
+    os.environ.setdefault("SDL_VIDEODRIVER", "offscreen")
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+pytest.importorskip("pyttsx3")
+pytest.importorskip("kivy")
+
+from kivy.core.window import Window  # noqa: E402,F401  纹理需要GL上下文
+from kivy.uix.image import Image  # noqa: E402
+
+REPO = Path(__file__).resolve().parent.parent
+VERSIONS = ["1.1", "1.2", "1.3", "1.4", "1.5", "1.6", "1.7", "1.8", "1.9", "1.11"]
+
+
+def load_version(version):
+    """按文件名加载某个版本的脚本(文件名带点，不能直接import)"""
+    path = REPO / f"{version}.py"
+    spec = importlib.util.spec_from_file_location(f"palm_{version.replace('.', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def camera_frame(w, h):
+    """模拟cap.read()返回的BGR帧"""
+    return np.random.default_rng(0).integers(0, 256, size=(h, w, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("version", VERSIONS)
+def test_get_texture_blits_camera_frame(version):
+    module = load_version(version)
+    layout = types.SimpleNamespace(texture=None, texture_size=None, camera_image=Image())
+
+    texture = module.CameraLayout.get_texture(layout, camera_frame(64, 48))
+    assert texture.size == (64, 48)
+    assert layout.camera_image.texture is texture
+
+    # 同尺寸的下一帧复用同一个纹理
+    assert module.CameraLayout.get_texture(layout, camera_frame(64, 48)) is texture
+
+    # 分辨率变化时重新创建纹理
+    resized = module.CameraLayout.get_texture(layout, camera_frame(32, 24))
+    assert resized is not texture
+    assert resized.size == (32, 24)
+
+
+def test_update_frame_blits_circle_roi():
+    module = load_version("12")
+    layout = types.SimpleNamespace(
+        grabber=types.SimpleNamespace(latest=lambda: (0.0, 1, camera_frame(64, 48))),
+        motion=module.MotionDetector(),
+        camera_image=Image(),
+        is_capturing=False,
+        progress_circle=None,
+        displayed_frame=None,
+        _displayed_frame_id=0,
+        _frame_size=None,
+        _last_activity=0,
+        _adjust_frame_rate=lambda: None,
+    )
+    layout._prepare_frame_buffers = types.MethodType(module.CameraLayout._prepare_frame_buffers, layout)
+
+    module.CameraLayout.update_frame(layout, 0)
+
+    # 纹理保持整帧大小，取景框区域已写入(圆心处是原始像素)
+    _, _, size, _ = layout._roi_bounds
+    assert layout._texture.size == (64, 48)
+    assert layout.camera_image.texture is layout._texture
+    assert layout.displayed_frame.shape == (size, size, 3)
+    assert (layout._masked_frame[size // 2, size // 2] == layout.displayed_frame[size // 2, size // 2]).all()